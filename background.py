@@ -0,0 +1,64 @@
+import queue
+import threading
+
+from tile import Tile
+from wfc import WaveFunctionCollapse
+
+class SolverSnapshot:
+    def __init__(self, result: WaveFunctionCollapse.WFCIterationResult,
+    changedCells: list[tuple[int, int, Tile | None]], stats: dict[str, int]) -> None:
+        self.result: WaveFunctionCollapse.WFCIterationResult = result
+        # (row, col, tile) copied when the snapshot was taken, so readers never touch the live grid
+        self.changedCells: list[tuple[int, int, Tile | None]] = changedCells
+        self.stats: dict[str, int] = stats
+
+class BackgroundSolver:
+    # runs an engine on a worker thread in slices of sliceTime seconds and posts a snapshot
+    # of what changed after each slice, so a render loop can poll it without waiting on the solve
+    def __init__(self, algo: WaveFunctionCollapse, sliceTime: float = 0.005, restartOnContradiction: bool = True) -> None:
+        self.algo: WaveFunctionCollapse = algo
+        self.sliceTime: float = sliceTime
+        self.restartOnContradiction: bool = restartOnContradiction
+
+        self._snapshots: queue.Queue[SolverSnapshot] = queue.Queue()
+        self._stopEvent = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopEvent.set()
+        if (self._thread.is_alive()):
+            self._thread.join()
+
+    def isRunning(self) -> bool:
+        return self._thread.is_alive()
+
+    def getSnapshots(self) -> list[SolverSnapshot]:
+        snapshots: list[SolverSnapshot] = []
+        while (True):
+            try:
+                snapshots.append(self._snapshots.get_nowait())
+            except queue.Empty:
+                return snapshots
+
+    def _run(self) -> None:
+        while (not self._stopEvent.is_set()):
+            result: WaveFunctionCollapse.WFCIterationResult = self.algo.runUntil(self.sliceTime)
+            if (result == WaveFunctionCollapse.WFCIterationResult.CONTRADICTION and self.restartOnContradiction
+            and self.algo.reroll()):
+                # only the cells around the contradiction were cleared, they are posted with the rest of the slice
+                result = WaveFunctionCollapse.WFCIterationResult.GENERATING
+
+            changedCells: list[tuple[int, int, Tile | None]] = [(r, c, self.algo.getTile(r, c)) for r, c in self.algo.changedCells]
+            self._snapshots.put(SolverSnapshot(result, changedCells, self.algo.stats.asDict()))
+
+            if (result == WaveFunctionCollapse.WFCIterationResult.COMPLETE):
+                return
+
+            if (result == WaveFunctionCollapse.WFCIterationResult.CONTRADICTION):
+                if (not self.restartOnContradiction):
+                    return
+
+                self.algo.restart()
@@ -0,0 +1,127 @@
+import os
+from typing import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from tile import ITilesProvider
+from rules import IRulesProvider, CompiledRuleSet
+from wfc import WaveFunctionCollapse
+
+class GenerationResult:
+    def __init__(self, seed: int, ids: list[list[int]] | None, stats: dict[str, int]) -> None:
+        self.seed: int = seed
+        # indexes into the compiled rule set's tiles, None if the solve gave up
+        self.ids: list[list[int]] | None = ids
+        self.stats: dict[str, int] = stats
+
+    def isSuccess(self) -> bool:
+        return self.ids != None
+
+    def __str__(self) -> str:
+        return f"(SEED: {self.seed}, SUCCESS: {self.isSuccess()}, STATS: {self.stats})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+class SolverPool:
+    # idle solvers kept by rules, grid shape, backend and backtracking, so a worker solving many grids of the same
+    # kind builds one solver and reset()s it for every seed after that instead of building a new one each time
+    def __init__(self, maxIdle: int = 4) -> None:
+        # at most this many idle solvers are kept for each kind, further releases are dropped
+        self.maxIdle: int = maxIdle
+        self._idle: dict[tuple, list[WaveFunctionCollapse]] = {}
+
+    def acquire(self, rules: CompiledRuleSet, gridSize: int | None = None, seed: int | None = None,
+    backend: str = WaveFunctionCollapse.PYTHON_BACKEND, maxBacktracks: int = 0, width: int | None = None,
+    height: int | None = None, periodicX: bool = False, periodicY: bool = False) -> WaveFunctionCollapse:
+        # a solver on an empty grid seeded with seed, release() it once its results have been read
+        width = width if width != None else gridSize
+        height = height if height != None else gridSize
+        idle: list[WaveFunctionCollapse] | None = self._idle.get(
+        SolverPool._getKey(rules, width, height, periodicX, periodicY, backend, maxBacktracks)) # type: ignore
+        if (idle != None and len(idle) != 0):
+            algo: WaveFunctionCollapse = idle.pop()
+            algo.reset(seed)
+            return algo
+
+        return WaveFunctionCollapse.fromRules(rules, seed=seed, backend=backend, maxBacktracks=maxBacktracks,
+        width=width, height=height, periodicX=periodicX, periodicY=periodicY)
+
+    def release(self, algo: WaveFunctionCollapse) -> None:
+        idle: list[WaveFunctionCollapse] = self._idle.setdefault(SolverPool._getKey(algo.rules, algo.width, algo.height,
+        algo.periodicX, algo.periodicY, algo.backend, algo.maxBacktracks), [])
+        if (len(idle) < self.maxIdle):
+            algo.instrumentation = None
+            idle.append(algo)
+
+    def clear(self) -> None:
+        self._idle.clear()
+
+    @staticmethod
+    def _getKey(rules: CompiledRuleSet, width: int, height: int, periodicX: bool, periodicY: bool, backend: str,
+    maxBacktracks: int) -> tuple:
+        # pooled solvers hold on to their rules, so the id of a rule set can't be reused while it is in the pool
+        return (id(rules), width, height, periodicX, periodicY, backend, maxBacktracks)
+
+class WorkerState:
+    # process wide, set once per pool worker by init() (passed as the pool's initializer) so tasks only carry their seed
+    rules: CompiledRuleSet | None = None
+    options: tuple | None = None
+    # solvers are reused across the tasks each pool worker runs, the parent passes a pool of its own to every call
+    # instead, so the rules of finished calls aren't kept alive by it
+    solverPool: SolverPool = SolverPool()
+
+    @staticmethod
+    def init(rules: CompiledRuleSet | str, options: tuple) -> None:
+        # rules are either pickled by the parent or the path of a cached table that each worker maps itself
+        WorkerState.rules = CompiledRuleSet.load(rules) if isinstance(rules, str) else rules
+        WorkerState.options = options
+
+def _solve(rules: CompiledRuleSet, options: tuple[int, str, int, int | None], seed: int,
+solverPool: SolverPool) -> GenerationResult:
+    gridSize, backend, maxBacktracks, maxRestarts = options
+    algo: WaveFunctionCollapse = solverPool.acquire(rules, gridSize, seed, backend=backend, maxBacktracks=maxBacktracks)
+
+    try:
+        if (not algo.solve(maxRestarts)):
+            return GenerationResult(seed, None, algo.stats.asDict())
+
+        return GenerationResult(seed, algo.getIds(), algo.stats.asDict())
+    finally:
+        solverPool.release(algo)
+
+def _solveInWorker(seed: int) -> GenerationResult:
+    return _solve(WorkerState.rules, WorkerState.options, seed, WorkerState.solverPool) # type: ignore
+
+def generateMany(tilesProvider: ITilesProvider, rulesProvider: IRulesProvider, gridSize: int, seeds: Iterable[int],
+workers: int | None = None, backend: str = WaveFunctionCollapse.PYTHON_BACKEND, maxBacktracks: int = 64,
+maxRestarts: int | None = None, cacheDir: str | None = None) -> Iterator[GenerationResult]:
+    # results are yielded as they finish, not in seed order, but each seed always produces the same grid
+    rules: CompiledRuleSet
+    workerRules: CompiledRuleSet | str
+    if (cacheDir != None):
+        rules = CompiledRuleSet.compileCached(tilesProvider, rulesProvider, cacheDir) # type: ignore
+        workerRules = CompiledRuleSet.getCachePath(tilesProvider, rulesProvider, cacheDir) # type: ignore
+    else:
+        rules = CompiledRuleSet.compile(tilesProvider, rulesProvider)
+        workerRules = rules
+
+    options: tuple[int, str, int, int | None] = (gridSize, backend, maxBacktracks, maxRestarts)
+
+    if (workers == None):
+        workers = os.cpu_count() or 1
+
+    if (workers <= 1):
+        solverPool: SolverPool = SolverPool()
+        for seed in seeds:
+            yield _solve(rules, options, seed, solverPool)
+        return
+
+    executor: ProcessPoolExecutor = ProcessPoolExecutor(max_workers=workers, initializer=WorkerState.init,
+    initargs=(workerRules, options))
+    try:
+        futures = [executor.submit(_solveInWorker, seed) for seed in seeds]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # a caller that stops early (close(), break, an exception) only waits for the seeds already being solved
+        executor.shutdown(cancel_futures=True)
@@ -0,0 +1,162 @@
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+import rules
+from rules import CompiledRuleSet
+from wfc import WaveFunctionCollapse, WFCStats
+
+# (metric, True if bigger is better) compared against a baseline
+_COMPARED_METRICS: tuple[tuple[str, bool], ...] = (
+    ("collapsesPerSecond", True),
+    ("stepP50", False),
+    ("stepP99", False),
+    ("peakMemory", False)
+)
+
+def runCase(compiledRules: CompiledRuleSet, gridSize: int, seeds: list[int],
+backend: str = WaveFunctionCollapse.PYTHON_BACKEND, maxBacktracks: int = 64,
+restartPolicy: str = WaveFunctionCollapse.RESTART_POLICY) -> dict[str, float]:
+    # every step is timed on its own, rendering and rule compilation are left out entirely
+    stepTimes: list[float] = []
+    totals: WFCStats = WFCStats()
+    totalTime: float = 0
+
+    # one solver is reset for every seed, so its contradiction history covers the whole case
+    algo: WaveFunctionCollapse = WaveFunctionCollapse.fromRules(compiledRules, gridSize, seeds[0],
+    backend=backend, maxBacktracks=maxBacktracks, restartPolicy=restartPolicy)
+    for seed in seeds:
+        algo.reset(seed)
+
+        while (True):
+            start: float = time.perf_counter()
+            result: WaveFunctionCollapse.WFCIterationResult = algo.wfc()
+            elapsed: float = time.perf_counter() - start
+
+            stepTimes.append(elapsed)
+            totalTime += elapsed
+
+            if (result == WaveFunctionCollapse.WFCIterationResult.COMPLETE):
+                break
+
+            if (result == WaveFunctionCollapse.WFCIterationResult.CONTRADICTION and not algo.reroll()):
+                algo.restart()
+
+        for name, value in algo.stats.asDict().items():
+            setattr(totals, name, getattr(totals, name) + value)
+
+    stepTimes.sort()
+    return {
+        "maps": len(seeds),
+        "time": totalTime,
+        "collapsesPerSecond": totals.collapses / totalTime if totalTime > 0 else 0.0,
+        "propagations": totals.propagations,
+        "contradictions": totals.contradictions,
+        "backtracks": totals.backtracks,
+        "restarts": totals.restarts,
+        "rerolls": totals.rerolls,
+        "restartsPerMap": totals.restarts / len(seeds),
+        "expectedRestartsPerMap": algo.history.getExpectedRestarts(),
+        "stepP50": _percentile(stepTimes, 0.5),
+        "stepP99": _percentile(stepTimes, 0.99),
+        # tracemalloc slows every allocation down, so memory comes from a separate untimed solve
+        "peakMemory": _measurePeakMemory(compiledRules, gridSize, seeds[0], backend, maxBacktracks, restartPolicy)
+    }
+
+def runMatrix(tileSets: list[str], gridSizes: list[int], seeds: list[int], backends: list[str],
+maxBacktracks: int = 64, restartPolicies: list[str] = [WaveFunctionCollapse.RESTART_POLICY]) -> list[dict]:
+    results: list[dict] = []
+    for tileSet in tileSets:
+        tilesProvider, rulesProvider = rules.getProviders(tileSet)
+        compiledRules: CompiledRuleSet = CompiledRuleSet.compile(tilesProvider, rulesProvider)
+
+        for backend in backends:
+            for gridSize in gridSizes:
+                for restartPolicy in restartPolicies:
+                    case: dict = {"tileSet": tileSet, "gridSize": gridSize, "backend": backend, "restartPolicy": restartPolicy}
+                    case.update(runCase(compiledRules, gridSize, seeds, backend, maxBacktracks, restartPolicy))
+                    results.append(case)
+
+    return results
+
+def compareToBaseline(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    # a metric regresses when it is worse than the baseline by more than tolerance, as a fraction of the baseline
+    baselineCases: dict[tuple, dict] = {_getCaseKey(case): case for case in baseline}
+    regressions: list[str] = []
+
+    for case in results:
+        key: tuple = _getCaseKey(case)
+        if (key not in baselineCases):
+            continue
+
+        for metric, biggerIsBetter in _COMPARED_METRICS:
+            old: float = baselineCases[key][metric]
+            new: float = case[metric]
+            if (biggerIsBetter and new < old * (1 - tolerance)) or (not biggerIsBetter and new > old * (1 + tolerance)):
+                regressions.append(f"{key}: {metric} went from {old:.6g} to {new:.6g}")
+
+    return regressions
+
+def _getCaseKey(case: dict) -> tuple:
+    # baselines saved before restart policies existed only ran the default one
+    return (case["tileSet"], case["gridSize"], case["backend"], case.get("restartPolicy", WaveFunctionCollapse.RESTART_POLICY))
+
+def _percentile(sortedValues: list[float], fraction: float) -> float:
+    # nearest rank
+    if (len(sortedValues) == 0):
+        return 0.0
+
+    return sortedValues[min(len(sortedValues) - 1, int(fraction * len(sortedValues)))]
+
+def _measurePeakMemory(compiledRules: CompiledRuleSet, gridSize: int, seed: int, backend: str, maxBacktracks: int,
+restartPolicy: str) -> int:
+    tracemalloc.start()
+    try:
+        algo: WaveFunctionCollapse = WaveFunctionCollapse.fromRules(compiledRules, gridSize, seed,
+        backend=backend, maxBacktracks=maxBacktracks, restartPolicy=restartPolicy)
+        algo.solve()
+
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the solver headlessly and print the results as JSON.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 30, 60])
+    parser.add_argument("--tile-sets", nargs="+", default=sorted(rules.TILE_SETS), choices=sorted(rules.TILE_SETS))
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1, 2, 3, 4])
+    parser.add_argument("--backends", nargs="+", default=[WaveFunctionCollapse.PYTHON_BACKEND],
+    choices=[WaveFunctionCollapse.PYTHON_BACKEND, WaveFunctionCollapse.NUMPY_BACKEND],
+    help="numpy is slower than python at every size so far, it is only here to measure the two against each other")
+    parser.add_argument("--max-backtracks", type=int, default=64)
+    parser.add_argument("--restart-policies", nargs="+", default=[WaveFunctionCollapse.RESTART_POLICY],
+    choices=[WaveFunctionCollapse.RESTART_POLICY, WaveFunctionCollapse.HOTSPOTS_POLICY, WaveFunctionCollapse.REROLL_POLICY])
+    parser.add_argument("--save-baseline", default=None, help="write the results to this file")
+    parser.add_argument("--baseline", default=None, help="compare the results against this file and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results: list[dict] = runMatrix(args.tile_sets, args.sizes, args.seeds, args.backends, args.max_backtracks,
+    args.restart_policies)
+    print(json.dumps(results, indent=4))
+
+    if (args.save_baseline != None):
+        with open(args.save_baseline, "w") as file:
+            json.dump(results, file, indent=4)
+
+    if (args.baseline != None):
+        with open(args.baseline) as file:
+            regressions: list[str] = compareToBaseline(results, json.load(file), args.tolerance)
+
+        for regression in regressions:
+            print(f"Regression {regression}", file=sys.stderr)
+
+        if (len(regressions) != 0):
+            return 1
+
+    return 0
+
+if (__name__ == "__main__"):
+    sys.exit(main())
\ No newline at end of file
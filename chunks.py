@@ -0,0 +1,213 @@
+import os
+import hashlib
+import tempfile
+from array import array
+from collections import OrderedDict
+from typing import Iterator
+
+from rules import CompiledRuleSet
+from wfc import WaveFunctionCollapse
+
+class ChunkedWorld:
+    # solves an unbounded world one chunkSize x chunkSize chunk at a time, every chunk's border is
+    # constrained by the neighbouring chunks that were already solved, so chunks can be requested in any order,
+    # a chunk the solved chunks around it leave no solution is solved again together with repairMargin cells
+    # of each of them, or a strip reaching the nearest unsolved chunk, which changes those solved chunks too
+    def __init__(self, rules: CompiledRuleSet, chunkSize: int, seed: int = 0, cacheSize: int = 64,
+    cacheDir: str | None = None, backend: str = WaveFunctionCollapse.PYTHON_BACKEND, maxBacktracks: int = 64,
+    maxRestarts: int = 100, repairMargin: int = 4) -> None:
+        self.rules: CompiledRuleSet = rules
+        self.chunkSize: int = chunkSize
+        self.seed: int = seed
+        self.cacheSize: int = cacheSize
+        # evicted chunks are written here so they can be reloaded instead of solved again
+        self.cacheDir: str = cacheDir if cacheDir != None else tempfile.mkdtemp(prefix="wfc_chunks_") # type: ignore
+        self.backend: str = backend
+        self.maxBacktracks: int = maxBacktracks
+        self.maxRestarts: int = maxRestarts
+        self.repairMargin: int = repairMargin
+
+        # (chunk row, chunk col) -> tile ids of the chunk in row major order, least recently used first
+        self._cache: OrderedDict[tuple[int, int], array] = OrderedDict()
+        self._evicted: set[tuple[int, int]] = set()
+        # every chunk is solved on the same solver, reset for each one
+        self._algo: WaveFunctionCollapse | None = None
+
+    def getChunk(self, chunkRow: int, chunkCol: int) -> list[list[int]]:
+        ids: array = self._getChunkIds(chunkRow, chunkCol)
+        return [ids[r * self.chunkSize:(r + 1) * self.chunkSize].tolist() for r in range(self.chunkSize)]
+
+    def getTileId(self, row: int, col: int) -> int:
+        chunkRow, r = divmod(row, self.chunkSize)
+        chunkCol, c = divmod(col, self.chunkSize)
+
+        return self._getChunkIds(chunkRow, chunkCol)[r * self.chunkSize + c]
+
+    def getChunksAround(self, chunkRow: int, chunkCol: int, radius: int) -> Iterator[tuple[int, int, list[list[int]]]]:
+        # nearest chunks first, e.g. for streaming in the area around a scrolling camera
+        around: list[tuple[int, int]] = [(r, c) for r in range(chunkRow - radius, chunkRow + radius + 1)
+        for c in range(chunkCol - radius, chunkCol + radius + 1)]
+        around.sort(key=lambda chunk: abs(chunk[0] - chunkRow) + abs(chunk[1] - chunkCol))
+
+        for r, c in around:
+            yield (r, c, self.getChunk(r, c))
+
+    def isSolved(self, chunkRow: int, chunkCol: int) -> bool:
+        return (chunkRow, chunkCol) in self._cache or (chunkRow, chunkCol) in self._evicted
+
+    def _getChunkIds(self, chunkRow: int, chunkCol: int) -> array:
+        key: tuple[int, int] = (chunkRow, chunkCol)
+        if (key in self._cache):
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        ids: array = self._load(key) if key in self._evicted else self._solve(chunkRow, chunkCol)
+        self._store(key, ids)
+
+        return ids
+
+    def _solve(self, chunkRow: int, chunkCol: int) -> array:
+        seed: int = self._getChunkSeed(chunkRow, chunkCol)
+        if (self._algo == None):
+            self._algo = WaveFunctionCollapse.fromRules(self.rules, self.chunkSize, seed,
+            backend=self.backend, maxBacktracks=self.maxBacktracks)
+        else:
+            self._algo.reset(seed)
+
+        algo: WaveFunctionCollapse = self._algo # type: ignore
+
+        for _ in range(self.maxRestarts + 1):
+            if (self._constrainBorders(algo, chunkRow, chunkCol) and algo.solve(0)):
+                return array('H', algo.ids)
+
+            algo.restart()
+
+        return self._repair(chunkRow, chunkCol, seed)
+
+    def _repair(self, chunkRow: int, chunkCol: int, seed: int) -> array:
+        # the chunk and the cells of the solved chunks within margin cells of it are solved together, pinning only the
+        # ring just outside of them, when that ring is closed it can leave no solution however far out it is, so the
+        # area is then stretched towards the nearest unsolved chunk, whose cells on the ring are left open
+        margin: int = self.repairMargin + 1
+        top: int = chunkRow * self.chunkSize - margin
+        left: int = chunkCol * self.chunkSize - margin
+        size: int = self.chunkSize + 2 * margin
+        areas: list[tuple[int, int, int, int]] = [(top, left, size, size)]
+
+        for rowStep, colStep in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            distance: int = 1
+            while (self.isSolved(chunkRow + rowStep * distance, chunkCol + colStep * distance)):
+                distance += 1
+
+            stretch: int = (distance - 1) * self.chunkSize + margin
+            areas.append((top + min(rowStep, 0) * stretch, left + min(colStep, 0) * stretch,
+            size + abs(rowStep) * stretch, size + abs(colStep) * stretch))
+
+        areas[1:] = sorted(areas[1:], key=lambda area: area[2] * area[3])
+
+        for top, left, height, width in areas:
+            ids: array | None = self._repairArea(chunkRow, chunkCol, seed, top, left, height, width)
+            if (ids != None):
+                return ids # type: ignore
+
+        raise RuntimeError(f"Couldn't solve chunk ({chunkRow}, {chunkCol}) against its neighbours.")
+
+    def _repairArea(self, chunkRow: int, chunkCol: int, seed: int, top: int, left: int, height: int,
+    width: int) -> array | None:
+        algo: WaveFunctionCollapse = WaveFunctionCollapse.fromRules(self.rules, seed=seed, backend=self.backend,
+        maxBacktracks=self.maxBacktracks, width=width, height=height)
+
+        neighbours: dict[tuple[int, int], array] = {}
+        for r in range(top // self.chunkSize, (top + height - 1) // self.chunkSize + 1):
+            for c in range(left // self.chunkSize, (left + width - 1) // self.chunkSize + 1):
+                if ((r, c) != (chunkRow, chunkCol) and self.isSolved(r, c)):
+                    neighbours[(r, c)] = self._getChunkIds(r, c)
+
+        for r in range(height):
+            for c in range(width):
+                key, index = self._locate(top + r, left + c)
+                if (key in neighbours and (r == 0 or c == 0 or r == height - 1 or c == width - 1)):
+                    algo.pin(r, c, neighbours[key][index])
+
+        # the pins are applied again once the whole area is cleared, however pinning them left it
+        if (not algo.unsolve(0, 0, height, width, self.maxRestarts)):
+            return None
+
+        ids: array = array('H', [0]) * (self.chunkSize * self.chunkSize)
+        for r in range(1, height - 1):
+            for c in range(1, width - 1):
+                key, index = self._locate(top + r, left + c)
+                if (key == (chunkRow, chunkCol)):
+                    ids[index] = algo.ids[r * width + c]
+                elif (key in neighbours):
+                    neighbours[key][index] = algo.ids[r * width + c]
+
+        # cached neighbours were changed in place, evicted ones (loading the others can evict them) are written out
+        for key, neighbourIds in neighbours.items():
+            if (key in self._evicted):
+                with open(self._getPath(key), "wb") as file:
+                    neighbourIds.tofile(file)
+
+        return ids
+
+    def _locate(self, row: int, col: int) -> tuple[tuple[int, int], int]:
+        # the chunk a world cell is in and its index in that chunk's ids
+        chunkRow, r = divmod(row, self.chunkSize)
+        chunkCol, c = divmod(col, self.chunkSize)
+
+        return ((chunkRow, chunkCol), r * self.chunkSize + c)
+
+    def _getChunkSeed(self, chunkRow: int, chunkCol: int) -> int:
+        digest: bytes = hashlib.sha256(f"{self.seed}:{chunkRow}:{chunkCol}".encode()).digest()
+        return int.from_bytes(digest[:8], "little")
+
+    def _constrainBorders(self, algo: WaveFunctionCollapse, chunkRow: int, chunkCol: int) -> bool:
+        last: int = self.chunkSize - 1
+
+        # the neighbour's tiles along the shared edge, and the rules they impose on this chunk
+        if (self.isSolved(chunkRow - 1, chunkCol)):
+            above: array = self._getChunkIds(chunkRow - 1, chunkCol)
+            for c in range(self.chunkSize):
+                if (not algo.restrict(0, c, self.rules.getMask(CompiledRuleSet.DOWN, above[last * self.chunkSize + c]))):
+                    return False
+
+        if (self.isSolved(chunkRow + 1, chunkCol)):
+            below: array = self._getChunkIds(chunkRow + 1, chunkCol)
+            for c in range(self.chunkSize):
+                if (not algo.restrict(last, c, self.rules.getMask(CompiledRuleSet.UP, below[c]))):
+                    return False
+
+        if (self.isSolved(chunkRow, chunkCol - 1)):
+            left: array = self._getChunkIds(chunkRow, chunkCol - 1)
+            for r in range(self.chunkSize):
+                if (not algo.restrict(r, 0, self.rules.getMask(CompiledRuleSet.RIGHT, left[r * self.chunkSize + last]))):
+                    return False
+
+        if (self.isSolved(chunkRow, chunkCol + 1)):
+            right: array = self._getChunkIds(chunkRow, chunkCol + 1)
+            for r in range(self.chunkSize):
+                if (not algo.restrict(r, last, self.rules.getMask(CompiledRuleSet.LEFT, right[r * self.chunkSize]))):
+                    return False
+
+        return True
+
+    def _store(self, key: tuple[int, int], ids: array) -> None:
+        self._cache[key] = ids
+        self._evicted.discard(key)
+
+        while (len(self._cache) > self.cacheSize):
+            evictedKey, evictedIds = self._cache.popitem(last=False)
+            with open(self._getPath(evictedKey), "wb") as file:
+                evictedIds.tofile(file)
+
+            self._evicted.add(evictedKey)
+
+    def _load(self, key: tuple[int, int]) -> array:
+        ids: array = array('H')
+        with open(self._getPath(key), "rb") as file:
+            ids.fromfile(file, self.chunkSize * self.chunkSize)
+
+        return ids
+
+    def _getPath(self, key: tuple[int, int]) -> str:
+        return os.path.join(self.cacheDir, f"chunk_{key[0]}_{key[1]}.bin")
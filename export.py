@@ -0,0 +1,119 @@
+import sys
+import zlib
+import struct
+from array import array
+from typing import BinaryIO, Iterator
+
+from tile import Tile
+
+# every writer takes the row major uint16 ids of a grid (e.g. WaveFunctionCollapse.getIdBuffer()) and its width,
+# and writes one row at a time so nothing per cell is ever built, no matter how large the map is
+IdBuffer = array | memoryview
+
+#region Formats
+RAW_EXTENSION: str = ".raw"
+NPY_EXTENSION: str = ".npy"
+PNG_EXTENSION: str = ".png"
+#endregion
+
+_NPY_MAGIC: bytes = b"\x93NUMPY\x01\x00"
+_PNG_SIGNATURE: bytes = b"\x89PNG\r\n\x1a\n"
+# bytes handed to zlib at a time when compressing a PNG
+_PNG_BLOCK_SIZE: int = 1 << 20
+
+def writeRaw(file: BinaryIO, ids: IdBuffer, width: int) -> None:
+    # little endian uint16, no header
+    for row in _getRows(ids, width):
+        file.write(row)
+
+def writeNpy(file: BinaryIO, ids: IdBuffer, width: int) -> None:
+    # a version 1.0 .npy file, the header is written by hand so saving doesn't need numpy
+    header: str = f"{{'descr': '<u2', 'fortran_order': False, 'shape': ({len(_flatten(ids)) // width}, {width}), }}"
+    # the magic, header length and header are padded with spaces to a multiple of 64 bytes, ending in a newline
+    padding: int = -(len(_NPY_MAGIC) + 2 + len(header) + 1) % 64
+    header += " " * padding + "\n"
+
+    file.write(_NPY_MAGIC)
+    file.write(struct.pack("<H", len(header)))
+    file.write(header.encode("latin1"))
+    writeRaw(file, ids, width)
+
+def writePng(file: BinaryIO, ids: IdBuffer, width: int, tiles: list[Tile], tileSize: int) -> None:
+    # composites the tile images into an RGBA image of (width * tileSize) x (height * tileSize), uncollapsed
+    # cells stay transparent, rows of pixels are compressed as they are built instead of holding the whole image
+    view: memoryview = _flatten(ids)
+    height: int = len(view) // width
+    tileRows: list[list[bytes]] = _getTileRows(tiles, tileSize)
+    blankRow: bytes = bytes(tileSize * 4)
+
+    file.write(_PNG_SIGNATURE)
+    # 8 bit RGBA, no interlacing
+    _writePngChunk(file, b"IHDR", struct.pack(">IIBBBBB", width * tileSize, height * tileSize, 8, 6, 0, 0, 0))
+
+    compressor = zlib.compressobj()
+    pending: bytearray = bytearray()
+    for r in range(height):
+        row: memoryview = view[r * width:(r + 1) * width]
+        for y in range(tileSize):
+            # every scanline starts with its filter type, 0 is no filtering
+            pending.append(0)
+            for id in row:
+                pending += tileRows[id][y] if id < len(tileRows) else blankRow
+
+            if (len(pending) >= _PNG_BLOCK_SIZE):
+                _writePngChunk(file, b"IDAT", compressor.compress(pending))
+                pending.clear()
+
+    _writePngChunk(file, b"IDAT", compressor.compress(pending) + compressor.flush())
+    _writePngChunk(file, b"IEND", b"")
+
+def save(path: str, ids: IdBuffer, width: int, tiles: list[Tile] | None = None, tileSize: int | None = None) -> None:
+    # picks the format from the extension, PNGs need the tiles the ids index into
+    with open(path, "wb") as file:
+        if (path.endswith(NPY_EXTENSION)):
+            writeNpy(file, ids, width)
+        elif (path.endswith(PNG_EXTENSION)):
+            if (tiles == None):
+                raise ValueError("Saving a PNG needs the tiles the ids refer to.")
+
+            writePng(file, ids, width, tiles, tileSize if tileSize != None else _getNativeTileSize(tiles)) # type: ignore
+        else:
+            writeRaw(file, ids, width)
+
+def _flatten(ids: IdBuffer) -> memoryview:
+    # a flat uint16 view of any contiguous buffer, including 2D ones such as getIdArray()
+    return memoryview(ids).cast("B").cast("H")
+
+def _getRows(ids: IdBuffer, width: int) -> Iterator[memoryview | array]:
+    view: memoryview = _flatten(ids)
+    for r in range(len(view) // width):
+        row: memoryview | array = view[r * width:(r + 1) * width]
+        if (sys.byteorder != "little"):
+            row = array('H', row)
+            row.byteswap()
+
+        yield row
+
+def _writePngChunk(file: BinaryIO, chunkType: bytes, data: bytes) -> None:
+    if (chunkType == b"IDAT" and len(data) == 0):
+        return
+
+    file.write(struct.pack(">I", len(data)))
+    file.write(chunkType)
+    file.write(data)
+    file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunkType))))
+
+def _getTileRows(tiles: list[Tile], tileSize: int) -> list[list[bytes]]:
+    # each tile's pixels scaled to tileSize, as one RGBA byte string per pixel row
+    import pygame
+
+    tileRows: list[list[bytes]] = []
+    for tile in tiles:
+        img: pygame.Surface = pygame.transform.scale(tile.getImg(), (tileSize, tileSize))
+        pixels: bytes = pygame.image.tostring(img, "RGBA")
+        tileRows.append([pixels[y * tileSize * 4:(y + 1) * tileSize * 4] for y in range(tileSize)])
+
+    return tileRows
+
+def _getNativeTileSize(tiles: list[Tile]) -> int:
+    return tiles[0].getImg().get_width()
\ No newline at end of file
@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import threading
+from typing import Callable
+
+class Instrumentation:
+    # attached to WaveFunctionCollapse.instrumentation, the engine only checks that attribute once per step
+    # and takes a separate timed path when it is set, so leaving it None costs next to nothing
+    #region Phases
+    ENTROPY_SCAN: str = "entropyScan"
+    CHOOSE_TILE: str = "chooseTile"
+    PROPAGATE: str = "propagate"
+    CONTRADICTION: str = "contradiction"
+    #endregion
+
+    #region Events
+    # collapse hooks are called with (row, col, tileIndex), propagate hooks with (row, col, succeeded)
+    # and contradiction hooks with (row, col) of the cell that ran out of options
+    COLLAPSE_EVENT: str = "collapse"
+    PROPAGATE_EVENT: str = "propagate"
+    CONTRADICTION_EVENT: str = "contradiction"
+    #endregion
+
+    def __init__(self, trace: bool = False) -> None:
+        self.counts: dict[str, int] = {}
+        self.times: dict[str, float] = {}
+        self._hooks: dict[str, list[Callable[..., None]]] = {
+            Instrumentation.COLLAPSE_EVENT: [],
+            Instrumentation.PROPAGATE_EVENT: [],
+            Instrumentation.CONTRADICTION_EVENT: []
+        }
+
+        # every timed phase and event is also kept as a Chrome trace event when tracing
+        self.trace: bool = trace
+        self._traceEvents: list[dict] = []
+        self._origin: float = time.perf_counter()
+
+        self.reset()
+
+    def reset(self) -> None:
+        for phase in (Instrumentation.ENTROPY_SCAN, Instrumentation.CHOOSE_TILE,
+        Instrumentation.PROPAGATE, Instrumentation.CONTRADICTION):
+            self.counts[phase] = 0
+            self.times[phase] = 0.0
+
+        self._traceEvents.clear()
+        self._origin = time.perf_counter()
+
+    def addHook(self, event: str, callback: Callable[..., None]) -> None:
+        if (event not in self._hooks):
+            raise ValueError(f"Unknown event '{event}'.")
+
+        self._hooks[event].append(callback)
+
+    def removeHook(self, event: str, callback: Callable[..., None]) -> None:
+        self._hooks[event].remove(callback)
+
+    def record(self, phase: str, start: float) -> None:
+        # start is the time.perf_counter() reading taken when the phase began
+        end: float = time.perf_counter()
+        self.counts[phase] += 1
+        self.times[phase] += end - start
+
+        if (self.trace):
+            self._traceEvents.append({"name": phase, "ph": "X", "ts": (start - self._origin) * 1e6,
+            "dur": (end - start) * 1e6, "pid": os.getpid(), "tid": threading.get_ident()})
+
+    def emit(self, event: str, *args: int | bool) -> None:
+        for callback in self._hooks[event]:
+            callback(*args)
+
+        if (self.trace):
+            self._traceEvents.append({"name": event, "ph": "i", "s": "t", "ts": (time.perf_counter() - self._origin) * 1e6,
+            "pid": os.getpid(), "tid": threading.get_ident(), "args": {"values": list(args)}})
+
+    def getStats(self) -> dict[str, dict[str, float]]:
+        stats: dict[str, dict[str, float]] = {}
+        for phase, count in self.counts.items():
+            stats[phase] = {"count": count, "time": self.times[phase],
+            "meanTime": self.times[phase] / count if count != 0 else 0.0}
+
+        return stats
+
+    def toChromeTrace(self) -> dict:
+        # loads in chrome://tracing or Perfetto
+        return {"traceEvents": self._traceEvents, "displayTimeUnit": "ms"}
+
+    def saveChromeTrace(self, path: str) -> None:
+        with open(path, "w") as file:
+            json.dump(self.toChromeTrace(), file)
+
+    def __str__(self) -> str:
+        return str(self.getStats())
+
+    def __repr__(self) -> str:
+        return self.__str__()
\ No newline at end of file
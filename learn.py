@@ -0,0 +1,143 @@
+import os
+import hashlib
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from tile import Tile, ITilesProvider, TileRegistry
+from rules import TileRuleSet, IRulesProvider, CompiledRuleSet
+
+class LearnedTilesProvider(ITilesProvider):
+    def __init__(self, tiles: list[Tile], frequencies: list[int]) -> None:
+        self._tiles: list[Tile] = tiles
+        # how many times each tile (or pattern) appeared in the sample
+        self._frequencies: list[int] = frequencies
+
+    def provide(self) -> list[Tile]:
+        return self._tiles
+
+    def getFrequencies(self) -> dict[Tile, int]:
+        return dict(zip(self._tiles, self._frequencies))
+
+    def getWeights(self) -> dict[Tile, float]:
+        # output reproduces the sample's tile distribution
+        return {tile: float(frequency) for tile, frequency in zip(self._tiles, self._frequencies)}
+
+class LearnedRulesProvider(IRulesProvider):
+    def __init__(self, ruleSets: dict[Tile, TileRuleSet]) -> None:
+        self._ruleSets: dict[Tile, TileRuleSet] = ruleSets
+
+    def provide(self) -> dict[Tile, TileRuleSet]:
+        return self._ruleSets
+
+# (direction, row offset, col offset) of the neighbour
+_NEIGHBOURS: tuple[tuple[int, int, int], ...] = (
+    (CompiledRuleSet.UP, -1, 0),
+    (CompiledRuleSet.RIGHT, 0, 1),
+    (CompiledRuleSet.DOWN, 1, 0),
+    (CompiledRuleSet.LEFT, 0, -1)
+)
+
+def learnAdjacency(sample: list[list[Tile]]) -> tuple[LearnedTilesProvider, LearnedRulesProvider]:
+    # every pair of neighbouring tiles in the sample becomes an allowed pair, in both directions
+    tiles: list[Tile] = []
+    indexes: dict[Tile, int] = {}
+    for row in sample:
+        for tile in row:
+            if (tile not in indexes):
+                indexes[tile] = len(tiles)
+                tiles.append(tile)
+
+    ids: np.ndarray = np.array([[indexes[tile] for tile in row] for row in sample], dtype=np.int64)
+    return _buildProviders(tiles, np.bincount(ids.ravel(), minlength=len(tiles)), _getAdjacency(ids, len(tiles)))
+
+def learnOverlapping(sample: np.ndarray, patternSize: int = 3, name: str | None = None,
+tileDir: str | None = None) -> tuple[LearnedTilesProvider, LearnedRulesProvider]:
+    # sample is an (H, W) array of colours (or (H, W, C) channels, which are packed into one value), every
+    # patternSize x patternSize window becomes a tile and two patterns may neighbour each other if they agree
+    # wherever they overlap when shifted by one cell in that direction
+    colours: np.ndarray = _packColours(sample)
+
+    # TileRegistry hands out one Tile per path, so patterns of different samples must never share a name, without
+    # one it is derived from the sample, and a given name has to be unique to the sample it is used for
+    if (name == None):
+        digest = hashlib.sha256(f"{colours.shape}:{patternSize}:".encode() + np.ascontiguousarray(colours).tobytes())
+        name = f"learned-{digest.hexdigest()[:16]}"
+
+    windows: np.ndarray = sliding_window_view(colours, (patternSize, patternSize))
+    windowCount: int = windows.shape[0] * windows.shape[1]
+
+    patterns, frequencies = np.unique(windows.reshape(windowCount, patternSize * patternSize),
+    axis=0, return_counts=True)
+    patterns = patterns.reshape(-1, patternSize, patternSize)
+    patternCount: int = len(patterns)
+
+    # each pattern's overlapping edge strips are reduced to integer keys, so agreement is a key comparison
+    compatibilities: np.ndarray = np.zeros((4, patternCount, patternCount), dtype=np.bool_)
+    for direction, rowOffset, colOffset in _NEIGHBOURS:
+        ownStrip: np.ndarray = _getShiftedStrip(patterns, rowOffset, colOffset)
+        otherStrip: np.ndarray = _getShiftedStrip(patterns, -rowOffset, -colOffset)
+        _, keys = np.unique(np.concatenate((ownStrip, otherStrip)), axis=0, return_inverse=True)
+        keys = keys.ravel()
+        compatibilities[direction] = keys[:patternCount, None] == keys[None, patternCount:]
+
+    tiles: list[Tile] = []
+    for i, pattern in enumerate(patterns):
+        imgPath: str = f"{name}#pattern{i}" if tileDir == None else os.path.join(tileDir, f"{name}_pattern{i}.png") # type: ignore
+        if (tileDir != None):
+            _savePatternImage(imgPath, int(pattern[0, 0]))
+
+        tiles.append(TileRegistry.get(imgPath))
+
+    return _buildProviders(tiles, frequencies, compatibilities)
+
+def loadBitmap(imgPath: str) -> np.ndarray:
+    # imported here so learning from arrays or tile maps doesn't need pygame
+    import pygame
+
+    # surfarray is indexed (x, y), samples are (row, col)
+    return np.transpose(pygame.surfarray.array3d(pygame.image.load(imgPath)), (1, 0, 2))
+
+def _getAdjacency(ids: np.ndarray, tileCount: int) -> np.ndarray:
+    compatibilities: np.ndarray = np.zeros((4, tileCount, tileCount), dtype=np.bool_)
+    height, width = ids.shape
+
+    for direction, rowOffset, colOffset in _NEIGHBOURS:
+        own: np.ndarray = ids[max(0, -rowOffset):height - max(0, rowOffset), max(0, -colOffset):width - max(0, colOffset)]
+        other: np.ndarray = ids[max(0, rowOffset):height - max(0, -rowOffset), max(0, colOffset):width - max(0, -colOffset)]
+        compatibilities[direction, own.ravel(), other.ravel()] = True
+
+    return compatibilities
+
+def _getShiftedStrip(patterns: np.ndarray, rowOffset: int, colOffset: int) -> np.ndarray:
+    # the part of each pattern that a neighbour at (rowOffset, colOffset) overlaps
+    size: int = patterns.shape[1]
+    strip: np.ndarray = patterns[:, max(0, rowOffset):size + min(0, rowOffset), max(0, colOffset):size + min(0, colOffset)]
+    return strip.reshape(len(patterns), -1)
+
+def _packColours(sample: np.ndarray) -> np.ndarray:
+    if (sample.ndim == 2):
+        return sample.astype(np.int64)
+
+    packed: np.ndarray = np.zeros(sample.shape[:2], dtype=np.int64)
+    for channel in range(sample.shape[2]):
+        packed = (packed << 8) | sample[:, :, channel].astype(np.int64)
+
+    return packed
+
+def _savePatternImage(imgPath: str, colour: int) -> None:
+    import pygame
+
+    img = pygame.Surface((1, 1))
+    img.fill(((colour >> 16) & 0xFF, (colour >> 8) & 0xFF, colour & 0xFF))
+    pygame.image.save(img, imgPath)
+
+def _buildProviders(tiles: list[Tile], frequencies: np.ndarray,
+compatibilities: np.ndarray) -> tuple[LearnedTilesProvider, LearnedRulesProvider]:
+    ruleSets: dict[Tile, TileRuleSet] = {}
+    for i, tile in enumerate(tiles):
+        allowed: list[set[Tile]] = [{tiles[j] for j in np.flatnonzero(compatibilities[direction, i])} for direction in range(4)]
+        ruleSets[tile] = TileRuleSet(allowed[CompiledRuleSet.UP], allowed[CompiledRuleSet.RIGHT],
+        allowed[CompiledRuleSet.DOWN], allowed[CompiledRuleSet.LEFT])
+
+    return (LearnedTilesProvider(tiles, [int(frequency) for frequency in frequencies]), LearnedRulesProvider(ruleSets))
\ No newline at end of file
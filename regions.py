@@ -0,0 +1,173 @@
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+from rules import CompiledRuleSet
+from wfc import WaveFunctionCollapse
+from batch import SolverPool, WorkerState
+
+# (top, left, height, width)
+Region = tuple[int, int, int, int]
+
+def _solveRegion(seed: int) -> list[list[int]] | None:
+    regionSize, backend, maxBacktracks, maxRestarts = WorkerState.options # type: ignore
+    algo: WaveFunctionCollapse = WorkerState.solverPool.acquire(WorkerState.rules, regionSize, seed, # type: ignore
+    backend=backend, maxBacktracks=maxBacktracks)
+
+    try:
+        if (not algo.solve(maxRestarts)):
+            return None
+
+        return algo.getIds()
+    finally:
+        WorkerState.solverPool.release(algo)
+
+def solveParallel(rules: CompiledRuleSet, gridSize: int, seed: int = 0, regionSize: int = 32, seamWidth: int = 2,
+workers: int | None = None, backend: str = WaveFunctionCollapse.PYTHON_BACKEND, maxBacktracks: int = 64,
+maxRestarts: int = 100, maxRounds: int = 20, repairMargin: int = 4) -> list[list[int]]:
+    # the grid is split into regions separated by seams that are seamWidth cells wide, so no two regions touch and
+    # they can all be solved at once, then the seams are solved around the fixed regions and only the regions next
+    # to a seam that contradicts are solved again
+    regions: list[Region] = _getRegions(gridSize, regionSize, seamWidth)
+    ids: list[list[int]] = [[-1] * gridSize for _ in range(gridSize)]
+
+    if (workers == None):
+        workers = os.cpu_count() or 1
+
+    pending: list[int] = list(range(len(regions)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=WorkerState.init,
+    initargs=(rules, (regionSize, backend, maxBacktracks, maxRestarts))) as executor:
+        for roundIndex in range(maxRounds):
+            seeds: list[int] = [_deriveSeed(seed, regionIndex, roundIndex) for regionIndex in pending]
+            for regionIndex, regionIds in zip(pending, executor.map(_solveRegion, seeds)):
+                if (regionIds == None):
+                    continue
+
+                # every region is solved as a full square and cropped, any part of a valid grid is still valid
+                top, left, height, width = regions[regionIndex]
+                for r in range(height):
+                    ids[top + r][left:left + width] = regionIds[r][:width]
+
+            failed: set[int] = {regionIndex for regionIndex in pending if ids[regions[regionIndex][0]][regions[regionIndex][1]] == -1}
+            if (len(failed) == 0):
+                failed = _solveSeams(rules, ids, regions, regionSize, seamWidth, repairMargin, _deriveSeed(seed, -1, roundIndex),
+                backend, maxBacktracks, maxRestarts)
+                if (len(failed) == 0):
+                    return ids
+
+            for regionIndex in failed:
+                top, left, height, width = regions[regionIndex]
+                for r in range(top, top + height):
+                    ids[r][left:left + width] = [-1] * width
+
+            pending = sorted(failed)
+
+    # the regions keep failing against each other, so the grid is solved in one piece instead
+    algo: WaveFunctionCollapse = WaveFunctionCollapse.fromRules(rules, gridSize, _deriveSeed(seed, -1, maxRounds),
+    backend=backend, maxBacktracks=maxBacktracks)
+    if (not algo.solve(maxRestarts)):
+        raise RuntimeError(f"Couldn't solve the {gridSize}x{gridSize} grid, neither in regions nor in one piece.")
+
+    return algo.getIds()
+
+def _solveSeams(rules: CompiledRuleSet, ids: list[list[int]], regions: list[Region], regionSize: int, seamWidth: int,
+repairMargin: int, seed: int, backend: str, maxBacktracks: int, maxRestarts: int) -> set[int]:
+    # the vertical seams are solved first, one strip per row of regions, then the horizontal ones one column of
+    # regions (and the crossing to its right) at a time, each against the vertical seams above and below it and the
+    # piece solved before it, every strip holds the seam and up to repairMargin + 1 cells of the regions around it
+    gridSize: int = len(ids)
+    stride: int = regionSize + seamWidth
+    regionPart: int = min(repairMargin + 1, regionSize)
+
+    strips: list[tuple[Region, Region]] = []
+    for top in range(0, gridSize, stride):
+        height: int = min(regionSize, gridSize - top)
+        for seamLeft in range(regionSize, gridSize, stride):
+            seamRight: int = min(seamLeft + seamWidth, gridSize)
+            stripRight: int = min(seamRight + regionPart, gridSize)
+            strips.append(((top, seamLeft, height, seamRight - seamLeft),
+            (top, seamLeft - regionPart, height, stripRight - seamLeft + regionPart)))
+
+    for seamTop in range(regionSize, gridSize, stride):
+        seamBottom: int = min(seamTop + seamWidth, gridSize)
+        stripBottom: int = min(seamBottom + regionPart, gridSize)
+        for left in range(0, gridSize, stride):
+            right: int = min(left + stride, gridSize)
+            stripLeft: int = max(left - 1, 0)
+            strips.append(((seamTop, left, seamBottom - seamTop, right - left),
+            (seamTop - regionPart, stripLeft, stripBottom - seamTop + regionPart, right - stripLeft)))
+
+    # strips of the same shape share solvers, but only within this call
+    solverPool: SolverPool = SolverPool()
+    for stripIndex, (seam, strip) in enumerate(strips):
+        contradiction: tuple[int, int] | None = _solveSeam(rules, ids, seam, strip,
+        _deriveSeed(seed, stripIndex, 0), backend, maxBacktracks, maxRestarts, solverPool)
+        if (contradiction != None):
+            return _getRegionsNear(regions, contradiction, seamWidth + repairMargin + 1) # type: ignore
+
+    return set()
+
+def _solveSeam(rules: CompiledRuleSet, ids: list[list[int]], seam: Region, strip: Region, seed: int, backend: str,
+maxBacktracks: int, maxRestarts: int, solverPool: SolverPool) -> tuple[int, int] | None:
+    # None once the seam is solved and written to ids, otherwise the cell that contradicted
+    gridSize: int = len(ids)
+    stripTop, stripLeft, stripHeight, stripWidth = strip
+    seamTop, seamLeft, seamHeight, seamWidth = seam[0] - stripTop, seam[1] - stripLeft, seam[2], seam[3]
+    algo: WaveFunctionCollapse = solverPool.acquire(rules, seed=seed, backend=backend, maxBacktracks=maxBacktracks,
+    width=stripWidth, height=stripHeight)
+
+    try:
+        # only the region cells along the seam are pinned, the rest of the grid never enters the solver
+        pinned: bool = True
+        for r in range(stripHeight):
+            for c in range(stripWidth):
+                if (not (seamTop <= r < seamTop + seamHeight and seamLeft <= c < seamLeft + seamWidth)):
+                    pinned = algo.pin(r, c, ids[stripTop + r][stripLeft + c]) and pinned
+
+        # when the tiles along a seam leave it no solution, solving it again rarely finds one, so it isn't retried
+        if (not (pinned and algo.unsolve(seamTop, seamLeft, seamHeight, seamWidth, 0))):
+            # the regions' cells next to the seam are solved again with it, only the strip's edges inside the grid
+            # stay pinned, they are all that joins the strip to the cells around it
+            for r in range(1 if stripTop != 0 else 0, stripHeight - 1 if stripTop + stripHeight != gridSize else stripHeight):
+                for c in range(1 if stripLeft != 0 else 0, stripWidth - 1 if stripLeft + stripWidth != gridSize else stripWidth):
+                    algo.unpin(r, c)
+
+            if (not algo.unsolve(0, 0, stripHeight, stripWidth, maxRestarts)):
+                row, col = algo.contradiction if algo.contradiction != None else (seamTop, seamLeft)
+                return (stripTop + row, stripLeft + col)
+
+        solved: list[list[int]] = algo.getIds()
+        for r in range(stripHeight):
+            ids[stripTop + r][stripLeft:stripLeft + stripWidth] = solved[r]
+
+        return None
+    finally:
+        solverPool.release(algo)
+
+def _getRegions(gridSize: int, regionSize: int, seamWidth: int) -> list[Region]:
+    regions: list[Region] = []
+    stride: int = regionSize + seamWidth
+
+    for top in range(0, gridSize, stride):
+        for left in range(0, gridSize, stride):
+            regions.append((top, left, min(regionSize, gridSize - top), min(regionSize, gridSize - left)))
+
+    return regions
+
+def _getRegionsNear(regions: list[Region], cell: tuple[int, int], margin: int) -> set[int]:
+    # regions within margin cells of the contradiction, those bordering the seam (or its repaired margin) it happened in
+    row, col = cell
+    near: set[int] = set()
+    for regionIndex, (top, left, height, width) in enumerate(regions):
+        if (top - margin <= row < top + height + margin and left - margin <= col < left + width + margin):
+            near.add(regionIndex)
+
+    # a contradiction can't be blamed on any region, so start over with all of them
+    if (len(near) == 0):
+        return set(range(len(regions)))
+
+    return near
+
+def _deriveSeed(seed: int, regionIndex: int, roundIndex: int) -> int:
+    digest: bytes = hashlib.sha256(f"{seed}:{regionIndex}:{roundIndex}".encode()).digest()
+    return int.from_bytes(digest[:8], "little")
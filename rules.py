@@ -1,6 +1,13 @@
+import os
 import abc
-
-from tile import Tile
+import math
+import itertools
+import json
+import mmap
+import struct
+import hashlib
+
+from tile import Tile, ITilesProvider, TileRegistry
 from tile import DefaultTileFactory, LandscapeTileFactory
 
 class TileRuleSet:
@@ -34,6 +41,248 @@ class IRulesProvider(abc.ABC):
     def provide() -> dict[Tile, TileRuleSet]:
         ...
 
+class CompiledRuleSet:
+    #region Directions
+    UP: int = 0
+    RIGHT: int = 1
+    DOWN: int = 2
+    LEFT: int = 3
+    #endregion
+
+    #region Serialization
+    FORMAT_VERSION: int = 1
+    _MAGIC: bytes = b"WFCR"
+    # magic, version, tile count, bytes per mask
+    _HEADER: struct.Struct = struct.Struct("<4sHHH")
+    _PATH_LENGTH: struct.Struct = struct.Struct("<H")
+    FILE_EXTENSION: str = ".wfcr"
+    # bumped whenever compile() changes how masks or weights are built from the same rules
+    COMPILE_VERSION: int = 1
+    #endregion
+
+    def __init__(self, tiles: list[Tile], masks: list[list[int]], weights: list[float] | None = None) -> None:
+        self.tiles: list[Tile] = tiles
+        self.indexes: dict[Tile, int] = {tile: i for i, tile in enumerate(tiles)}
+        # masks[direction][tileIndex] is the bitmask of tile indexes allowed next to the tile in that direction
+        self.masks: list[list[int]] = masks
+        self.weights: list[float] = weights if weights != None else [1.0] * len(tiles) # type: ignore
+        # w * log(w) of every weight, so Shannon entropy can be kept up to date without calling log per tile
+        self.weightLogWeights: list[float] = [weight * math.log(weight) for weight in self.weights]
+        self.allMask: int = (1 << len(tiles)) - 1
+
+        # _supports[direction] caches the union of the masks of every tile in an options bitmask
+        self._supports: list[dict[int, int]] = [{}, {}, {}, {}]
+        # options bitmask -> (tile indexes, running total of their weights) for weighted choices
+        self._cumulativeWeights: dict[int, tuple[list[int], list[float]]] = {}
+
+    def getMask(self, direction: int, tileIndex: int) -> int:
+        return self.masks[direction][tileIndex]
+
+    def getSupport(self, direction: int, options: int) -> int:
+        supports: dict[int, int] = self._supports[direction]
+        if (options in supports):
+            return supports[options]
+
+        support: int = 0
+        for tileIndex in CompiledRuleSet.maskIndexes(options):
+            support |= self.masks[direction][tileIndex]
+
+        supports[options] = support
+        return support
+
+    def getCumulativeWeights(self, options: int) -> tuple[list[int], list[float]]:
+        if (options in self._cumulativeWeights):
+            return self._cumulativeWeights[options]
+
+        indexes: list[int] = CompiledRuleSet.maskIndexes(options)
+        cumulative: list[float] = list(itertools.accumulate(self.weights[tileIndex] for tileIndex in indexes))
+
+        self._cumulativeWeights[options] = (indexes, cumulative)
+        return (indexes, cumulative)
+
+    @staticmethod
+    def getEntropy(sumWeights: float, sumWeightLogWeights: float) -> float:
+        # Shannon entropy of options chosen in proportion to their weights
+        return math.log(sumWeights) - sumWeightLogWeights / sumWeights
+
+    @staticmethod
+    def opposite(direction: int) -> int:
+        return (direction + 2) % 4
+
+    def toMask(self, tiles: set[Tile] | list[Tile]) -> int:
+        mask: int = 0
+        for tile in tiles:
+            if (tile in self.indexes):
+                mask |= 1 << self.indexes[tile]
+
+        return mask
+
+    def fromMask(self, mask: int) -> list[Tile]:
+        return [self.tiles[i] for i in CompiledRuleSet.maskIndexes(mask)]
+
+    def toJson(self) -> str:
+        return json.dumps({
+            "version": CompiledRuleSet.FORMAT_VERSION,
+            "tiles": [tile.getImgPath() for tile in self.tiles],
+            "weights": self.weights,
+            "masks": self.masks
+        })
+
+    @staticmethod
+    def fromJson(text: str) -> 'CompiledRuleSet':
+        data: dict = json.loads(text)
+        if (data["version"] != CompiledRuleSet.FORMAT_VERSION):
+            raise ValueError(f"Unsupported rule table version {data['version']}.")
+
+        return CompiledRuleSet([TileRegistry.get(path) for path in data["tiles"]], data["masks"], data["weights"])
+
+    def toBytes(self) -> bytes:
+        maskBytes: int = max(1, (len(self.tiles) + 7) // 8)
+        parts: list[bytes] = [CompiledRuleSet._HEADER.pack(CompiledRuleSet._MAGIC, CompiledRuleSet.FORMAT_VERSION,
+        len(self.tiles), maskBytes)]
+
+        for tile in self.tiles:
+            path: bytes = tile.getImgPath().encode()
+            parts.append(CompiledRuleSet._PATH_LENGTH.pack(len(path)))
+            parts.append(path)
+
+        parts.append(struct.pack(f"<{len(self.tiles)}d", *self.weights))
+        for directionMasks in self.masks:
+            for mask in directionMasks:
+                parts.append(mask.to_bytes(maskBytes, "little"))
+
+        return b"".join(parts)
+
+    @staticmethod
+    def fromBuffer(buffer: bytes | mmap.mmap) -> 'CompiledRuleSet':
+        magic, version, tileCount, maskBytes = CompiledRuleSet._HEADER.unpack_from(buffer, 0)
+        if (magic != CompiledRuleSet._MAGIC or version != CompiledRuleSet.FORMAT_VERSION):
+            raise ValueError("Not a compiled rule table, or an unsupported version of one.")
+
+        offset: int = CompiledRuleSet._HEADER.size
+        tiles: list[Tile] = []
+        for _ in range(tileCount):
+            (length,) = CompiledRuleSet._PATH_LENGTH.unpack_from(buffer, offset)
+            offset += CompiledRuleSet._PATH_LENGTH.size
+            tiles.append(TileRegistry.get(bytes(buffer[offset:offset + length]).decode()))
+            offset += length
+
+        weights: list[float] = list(struct.unpack_from(f"<{tileCount}d", buffer, offset))
+        offset += 8 * tileCount
+
+        masks: list[list[int]] = []
+        for _ in range(4):
+            directionMasks: list[int] = []
+            for _ in range(tileCount):
+                directionMasks.append(int.from_bytes(buffer[offset:offset + maskBytes], "little"))
+                offset += maskBytes
+            masks.append(directionMasks)
+
+        return CompiledRuleSet(tiles, masks, weights)
+
+    def save(self, path: str) -> None:
+        # written to a temporary file first so a reader never maps a half written table
+        temporaryPath: str = f"{path}.{os.getpid()}.tmp"
+        with open(temporaryPath, "wb") as file:
+            file.write(self.toBytes())
+
+        os.replace(temporaryPath, path)
+
+    @staticmethod
+    def load(path: str) -> 'CompiledRuleSet':
+        with open(path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                return CompiledRuleSet.fromBuffer(buffer)
+
+    def getHash(self) -> str:
+        return hashlib.sha256(self.toBytes()).hexdigest()
+
+    @staticmethod
+    def getCachePath(tilesProvider: ITilesProvider, rulesProvider: IRulesProvider, cacheDir: str) -> str:
+        # keyed by what the providers return rather than by their type, so providers that carry their own data
+        # (e.g. learned ones) get a table each, and editing a factory's rules invalidates its cached table
+        tiles: list[Tile] = tilesProvider.provide()
+        ruleSets: dict[Tile, TileRuleSet] = rulesProvider.provide()
+        weights: dict[Tile, float] = tilesProvider.getWeights()
+
+        rules: list[list] = []
+        for tile in tiles:
+            ruleSet: TileRuleSet = ruleSets[tile]
+            rules.append([tile.getImgPath(), float(weights.get(tile, 1.0))] +
+            [sorted(neighbour.getImgPath() for neighbour in neighbours)
+            for neighbours in (ruleSet.getUp(), ruleSet.getRight(), ruleSet.getDown(), ruleSet.getLeft())])
+
+        digest = hashlib.sha256(json.dumps({"format": CompiledRuleSet.FORMAT_VERSION,
+        "compile": CompiledRuleSet.COMPILE_VERSION, "rules": rules}).encode())
+
+        return os.path.join(cacheDir, f"{digest.hexdigest()}{CompiledRuleSet.FILE_EXTENSION}")
+
+    @staticmethod
+    def compileCached(tilesProvider: ITilesProvider, rulesProvider: IRulesProvider, cacheDir: str) -> 'CompiledRuleSet':
+        path: str = CompiledRuleSet.getCachePath(tilesProvider, rulesProvider, cacheDir)
+        if (os.path.exists(path)):
+            try:
+                return CompiledRuleSet.load(path)
+            except (ValueError, struct.error):
+                pass
+
+        compiled: CompiledRuleSet = CompiledRuleSet.compile(tilesProvider, rulesProvider)
+        os.makedirs(cacheDir, exist_ok=True)
+        compiled.save(path)
+
+        return compiled
+
+    def toRuleSets(self) -> dict[Tile, TileRuleSet]:
+        ruleSets: dict[Tile, TileRuleSet] = {}
+        for i, tile in enumerate(self.tiles):
+            ruleSets[tile] = TileRuleSet(set(self.fromMask(self.masks[CompiledRuleSet.UP][i])),
+            set(self.fromMask(self.masks[CompiledRuleSet.RIGHT][i])),
+            set(self.fromMask(self.masks[CompiledRuleSet.DOWN][i])),
+            set(self.fromMask(self.masks[CompiledRuleSet.LEFT][i])))
+
+        return ruleSets
+
+    @staticmethod
+    def maskIndexes(mask: int) -> list[int]:
+        indexes: list[int] = []
+        while (mask != 0):
+            lowest: int = mask & -mask
+            indexes.append(lowest.bit_length() - 1)
+            mask ^= lowest
+
+        return indexes
+
+    @staticmethod
+    def compile(tilesProvider: ITilesProvider, rulesProvider: IRulesProvider) -> 'CompiledRuleSet':
+        tiles: list[Tile] = tilesProvider.provide()
+        ruleSets: dict[Tile, TileRuleSet] = rulesProvider.provide()
+
+        indexer = CompiledRuleSet(tiles, [[], [], [], []])
+        masks: list[list[int]] = [[], [], [], []]
+        for tile in tiles:
+            ruleSet: TileRuleSet = ruleSets[tile]
+            masks[CompiledRuleSet.UP].append(indexer.toMask(ruleSet.getUp()))
+            masks[CompiledRuleSet.RIGHT].append(indexer.toMask(ruleSet.getRight()))
+            masks[CompiledRuleSet.DOWN].append(indexer.toMask(ruleSet.getDown()))
+            masks[CompiledRuleSet.LEFT].append(indexer.toMask(ruleSet.getLeft()))
+
+        # a pair of neighbours is only allowed if both tiles' rules allow it,
+        # which makes every constraint symmetric as propagation expects
+        for direction in range(4):
+            opposite: int = CompiledRuleSet.opposite(direction)
+            for tileIndex in range(len(tiles)):
+                for other in CompiledRuleSet.maskIndexes(masks[direction][tileIndex]):
+                    if (not (masks[opposite][other] >> tileIndex) & 1):
+                        masks[direction][tileIndex] &= ~(1 << other)
+
+        tileWeights: dict[Tile, float] = tilesProvider.getWeights()
+        weights: list[float] = [float(tileWeights.get(tile, 1.0)) for tile in tiles]
+        for tile, weight in zip(tiles, weights):
+            if (weight <= 0):
+                raise ValueError(f"Tile '{tile}' has weight {weight}, weights must be positive.")
+
+        return CompiledRuleSet(tiles, masks, weights)
+
 class DefaultTileRuleSetFactory(IRulesProvider):
     #region Tile Ruleset IDs
     BLANK_ID: int = 0
@@ -242,4 +491,17 @@ class LandscapeTileRuleSetFactory(IRulesProvider):
         ruleSet = TileRuleSet(up, right, down, left)
         LandscapeTileRuleSetFactory._createdRuleSets[LandscapeTileRuleSetFactory.LIGHT_FOREST_ID] = ruleSet
 
-        return ruleSet
\ No newline at end of file
+        return ruleSet
+
+# tile set name -> (tiles provider, rules provider)
+TILE_SETS: dict[str, tuple[type[ITilesProvider], type[IRulesProvider]]] = {
+    "default": (DefaultTileFactory, DefaultTileRuleSetFactory),
+    "landscape": (LandscapeTileFactory, LandscapeTileRuleSetFactory)
+}
+
+def getProviders(tileSet: str) -> tuple[ITilesProvider, IRulesProvider]:
+    if (tileSet not in TILE_SETS):
+        raise ValueError(f"Unknown tile set '{tileSet}'.")
+
+    tilesProviderType, rulesProviderType = TILE_SETS[tileSet]
+    return (tilesProviderType(), rulesProviderType())
@@ -0,0 +1,275 @@
+import sys
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import argparse
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import rules
+from rules import CompiledRuleSet
+from wfc import WaveFunctionCollapse
+from batch import SolverPool
+
+class GenerationRequest:
+    #region Limits
+    # requests arrive over the network, anything larger would tie up a worker for too long
+    MAX_GRID_SIZE: int = 512
+    #endregion
+
+    def __init__(self, tileSet: str, gridSize: int, seed: int, pins: list[tuple[int, int, int]] | None = None,
+    backend: str = WaveFunctionCollapse.PYTHON_BACKEND, maxBacktracks: int = 64, maxRestarts: int = 100) -> None:
+        self.tileSet: str = tileSet
+        self.gridSize: int = gridSize
+        # seeded runs are deterministic, which is what makes results safe to cache and share
+        self.seed: int = seed
+        # (row, col, tile index) of every pinned cell
+        self.pins: list[tuple[int, int, int]] = [tuple(pin) for pin in pins] if pins != None else [] # type: ignore
+        self.backend: str = backend
+        self.maxBacktracks: int = maxBacktracks
+        self.maxRestarts: int = maxRestarts
+
+    @staticmethod
+    def fromDict(data: dict) -> 'GenerationRequest':
+        # raises ValueError for anything out of range, the data comes straight off the socket
+        gridSize: int = int(data["gridSize"])
+        if (not 0 < gridSize <= GenerationRequest.MAX_GRID_SIZE):
+            raise ValueError(f"gridSize must be between 1 and {GenerationRequest.MAX_GRID_SIZE}, got {gridSize}.")
+
+        pinsData: list = data.get("pins") or []
+        if (not isinstance(pinsData, list)):
+            raise ValueError("pins must be a list of [row, col, tile index] triples.")
+
+        pins: list[tuple[int, int, int]] = []
+        for pin in pinsData:
+            if (not isinstance(pin, (list, tuple)) or len(pin) != 3):
+                raise ValueError(f"A pin is a [row, col, tile index] triple, got {pin!r}.")
+
+            row, col, tileIndex = (int(value) for value in pin)
+            if (not (0 <= row < gridSize and 0 <= col < gridSize) or tileIndex < 0):
+                raise ValueError(f"Pin {pin!r} is outside the {gridSize}x{gridSize} grid or has a negative tile index.")
+
+            pins.append((row, col, tileIndex))
+
+        maxBacktracks: int = int(data.get("maxBacktracks", 64))
+        maxRestarts: int = int(data.get("maxRestarts", 100))
+        if (maxBacktracks < 0 or maxRestarts < 0):
+            raise ValueError("maxBacktracks and maxRestarts can't be negative.")
+
+        return GenerationRequest(data["tileSet"], gridSize, int(data["seed"]), pins,
+        data.get("backend", WaveFunctionCollapse.PYTHON_BACKEND), maxBacktracks, maxRestarts)
+
+    def asDict(self) -> dict:
+        return {"tileSet": self.tileSet, "gridSize": self.gridSize, "seed": self.seed, "pins": self.pins,
+        "backend": self.backend, "maxBacktracks": self.maxBacktracks, "maxRestarts": self.maxRestarts}
+
+    def getKey(self) -> str:
+        # pins are sorted so the order they were given in doesn't split the cache
+        data: dict = self.asDict()
+        data["pins"] = sorted(data["pins"])
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+class GenerationResponse:
+    def __init__(self, gridSize: int, ids: bytes | None, tiles: list[str], stats: dict[str, int]) -> None:
+        self.gridSize: int = gridSize
+        # row major little endian uint16 tile indexes, None if the request couldn't be solved
+        self.ids: bytes | None = ids
+        self.tiles: list[str] = tiles
+        self.stats: dict[str, int] = stats
+
+    def isSuccess(self) -> bool:
+        return self.ids != None
+
+    def getIds(self) -> array:
+        ids: array = array('H')
+        if (self.ids != None):
+            ids.frombytes(self.ids) # type: ignore
+            if (sys.byteorder != "little"):
+                ids.byteswap()
+
+        return ids
+
+    def asDict(self) -> dict:
+        return {"gridSize": self.gridSize, "ids": base64.b64encode(self.ids).decode() if self.ids != None else None, # type: ignore
+        "tiles": self.tiles, "stats": self.stats}
+
+class ServiceWorkerState:
+    # process wide like batch.WorkerState, but filled in lazily since the executor's workers serve any tile set,
+    # each one is compiled once per worker process
+    rules: dict[str, CompiledRuleSet] = {}
+    # and solvers are reused across the requests each worker solves
+    solverPool: SolverPool = SolverPool()
+
+    @staticmethod
+    def getRules(tileSet: str) -> CompiledRuleSet:
+        if (tileSet not in ServiceWorkerState.rules):
+            tilesProvider, rulesProvider = rules.getProviders(tileSet)
+            ServiceWorkerState.rules[tileSet] = CompiledRuleSet.compile(tilesProvider, rulesProvider)
+
+        return ServiceWorkerState.rules[tileSet]
+
+def _solveRequest(request: GenerationRequest) -> GenerationResponse:
+    compiledRules: CompiledRuleSet = ServiceWorkerState.getRules(request.tileSet)
+    tiles: list[str] = [tile.getImgPath() for tile in compiledRules.tiles]
+    algo: WaveFunctionCollapse = ServiceWorkerState.solverPool.acquire(compiledRules, request.gridSize, request.seed,
+    backend=request.backend, maxBacktracks=request.maxBacktracks)
+
+    try:
+        # a pin only fails when the pins before it already rule its tile out, so no restart could place it
+        pinned: bool = True
+        for r, c, tileIndex in request.pins:
+            pinned = algo.pin(r, c, tileIndex) and pinned
+
+        if (not pinned or not algo.solve(request.maxRestarts)):
+            return GenerationResponse(request.gridSize, None, tiles, algo.stats.asDict())
+
+        ids: array = array('H', algo.ids)
+        if (sys.byteorder != "little"):
+            ids.byteswap()
+
+        return GenerationResponse(request.gridSize, ids.tobytes(), tiles, algo.stats.asDict())
+    finally:
+        ServiceWorkerState.solverPool.release(algo)
+
+class GenerationService:
+    # solves requests on a bounded process pool, identical requests that arrive while one is being solved wait
+    # for that solve instead of starting their own, and finished results are kept in an LRU cache for ttl seconds
+    def __init__(self, workers: int | None = None, maxPending: int = 64, cacheSize: int = 256, ttl: float = 600) -> None:
+        self._executor: ProcessPoolExecutor = ProcessPoolExecutor(max_workers=workers)
+        # at most maxPending solves are queued or running, further callers wait here instead of growing the queue
+        self._slots: asyncio.Semaphore = asyncio.Semaphore(maxPending)
+
+        self.cacheSize: int = cacheSize
+        self.ttl: float = ttl
+        # request key -> (expiry time, response), least recently used first
+        self._cache: OrderedDict[str, tuple[float, GenerationResponse]] = OrderedDict()
+        self._inFlight: dict[str, asyncio.Task] = {}
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.coalesced: int = 0
+
+    async def generate(self, request: GenerationRequest) -> GenerationResponse:
+        key: str = request.getKey()
+
+        cached: GenerationResponse | None = self._getCached(key)
+        if (cached != None):
+            self.hits += 1
+            return cached # type: ignore
+
+        if (key in self._inFlight):
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            # the solve is a task of its own rather than part of the first caller, so cancelling any caller, the
+            # first one included, leaves everyone else waiting on it
+            self._inFlight[key] = asyncio.get_running_loop().create_task(self._solve(key, request))
+
+        return await asyncio.shield(self._inFlight[key])
+
+    async def _solve(self, key: str, request: GenerationRequest) -> GenerationResponse:
+        try:
+            async with self._slots:
+                response: GenerationResponse = await asyncio.get_running_loop().run_in_executor(self._executor,
+                _solveRequest, request)
+
+            self._store(key, response)
+            return response
+        finally:
+            del self._inFlight[key]
+
+    def getStats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+        "cached": len(self._cache), "inFlight": len(self._inFlight)}
+
+    def close(self) -> None:
+        self._executor.shutdown(cancel_futures=True)
+
+    def _getCached(self, key: str) -> GenerationResponse | None:
+        if (key not in self._cache):
+            return None
+
+        expiry, response = self._cache[key]
+        if (time.monotonic() >= expiry):
+            del self._cache[key]
+            return None
+
+        self._cache.move_to_end(key)
+        return response
+
+    def _store(self, key: str, response: GenerationResponse) -> None:
+        self._cache[key] = (time.monotonic() + self.ttl, response)
+        self._cache.move_to_end(key)
+
+        while (len(self._cache) > self.cacheSize):
+            self._cache.popitem(last=False)
+
+async def _handleConnection(service: GenerationService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    # one JSON request per line in, one JSON response per line out, in the same order
+    try:
+        while (True):
+            line: bytes = await reader.readline()
+            if (len(line) == 0):
+                break
+
+            reply: dict
+            try:
+                data: dict = json.loads(line)
+                if (not isinstance(data, dict)):
+                    raise ValueError(f"A request is a JSON object, got {type(data).__name__}.")
+
+                if (data.get("command") == "stats"):
+                    reply = service.getStats()
+                else:
+                    reply = (await service.generate(GenerationRequest.fromDict(data))).asDict()
+            except (ValueError, KeyError, TypeError, IndexError) as e:
+                reply = {"error": str(e)}
+
+            writer.write(json.dumps(reply).encode() + b"\n")
+            await writer.drain()
+    finally:
+        writer.close()
+
+async def serve(service: GenerationService, host: str = "127.0.0.1", port: int = 8765, unixPath: str | None = None) -> None:
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await _handleConnection(service, reader, writer)
+
+    server: asyncio.Server
+    if (unixPath != None):
+        server = await asyncio.start_unix_server(handle, unixPath)
+    else:
+        server = await asyncio.start_server(handle, host, port)
+
+    async with server:
+        await server.serve_forever()
+
+async def _run(args: argparse.Namespace) -> None:
+    service = GenerationService(args.workers, args.max_pending, args.cache_size, args.ttl)
+    try:
+        await serve(service, args.host, args.port, args.unix)
+    finally:
+        service.close()
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Serve generated grids over a JSON lines socket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="listen on this unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-pending", type=int, default=64)
+    parser.add_argument("--cache-size", type=int, default=256)
+    parser.add_argument("--ttl", type=float, default=600)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(_run(args))
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+if (__name__ == "__main__"):
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,38 @@
+import tempfile
+import unittest
+
+import rules
+from rules import CompiledRuleSet
+from chunks import ChunkedWorld
+
+from test_wfc import getInvalidPairs
+
+class TestChunkedWorld(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.rules: CompiledRuleSet = CompiledRuleSet.compile(*rules.getProviders("default"))
+
+    def test_chunkBetweenFourSolvedChunksJoinsThem(self) -> None:
+        # the middle chunk is solved last, against all four of its neighbours, with the cache too small to hold them
+        for seed in range(10):
+            with tempfile.TemporaryDirectory() as cacheDir:
+                world: ChunkedWorld = ChunkedWorld(self.rules, 8, seed, cacheSize=3, cacheDir=cacheDir)
+                for chunkRow, chunkCol in ((0, 1), (1, 0), (1, 2), (2, 1), (1, 1), (0, 0), (0, 2), (2, 0), (2, 2)):
+                    world.getChunk(chunkRow, chunkCol)
+
+                ids: list[list[int]] = [[world.getTileId(row, col) for col in range(24)] for row in range(24)]
+                self.assertEqual(getInvalidPairs(self.rules, ids), 0, seed)
+
+    def test_walkingCameraKeepsChunksJoined(self) -> None:
+        for seed in range(4):
+            with tempfile.TemporaryDirectory() as cacheDir:
+                world: ChunkedWorld = ChunkedWorld(self.rules, 8, seed, cacheSize=12, cacheDir=cacheDir)
+                for step in range(6):
+                    for _ in world.getChunksAround(0, step * 3, 1):
+                        pass
+
+                ids: list[list[int]] = [[world.getTileId(row, col) for col in range(-8, 136)] for row in range(-8, 16)]
+                self.assertEqual(getInvalidPairs(self.rules, ids), 0, seed)
+
+if __name__ == "__main__":
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,21 @@
+import unittest
+
+import numpy as np
+
+from learn import learnOverlapping
+
+class TestLearnOverlapping(unittest.TestCase):
+    def test_differentSamplesDontShareTiles(self) -> None:
+        checkers: np.ndarray = np.array([[0, 1, 0, 1], [1, 0, 1, 0], [0, 1, 0, 1], [1, 0, 1, 0]])
+        blocks: np.ndarray = np.array([[0, 0, 1, 1], [0, 0, 1, 1], [1, 1, 0, 0], [1, 1, 0, 0]])
+
+        first, _ = learnOverlapping(checkers, 2)
+        second, _ = learnOverlapping(blocks, 2)
+        self.assertEqual(set(first.provide()) & set(second.provide()), set())
+
+    def test_sameSampleSharesTiles(self) -> None:
+        sample: np.ndarray = np.array([[0, 1, 2], [2, 0, 1], [1, 2, 0]])
+        self.assertEqual(learnOverlapping(sample, 2)[0].provide(), learnOverlapping(sample.copy(), 2)[0].provide())
+
+if __name__ == "__main__":
+    unittest.main()
\ No newline at end of file
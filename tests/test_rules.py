@@ -0,0 +1,36 @@
+import tempfile
+import unittest
+
+from tile import TileRegistry, DefaultTileFactory
+from rules import CompiledRuleSet, DefaultTileRuleSetFactory
+from learn import learnAdjacency
+
+class TestCachePath(unittest.TestCase):
+    def test_learnedProvidersGetDistinctPaths(self) -> None:
+        a, b, c = (TileRegistry.get(f"test#tile{i}") for i in range(3))
+        first = learnAdjacency([[a, b], [b, a]])
+        second = learnAdjacency([[a, c], [c, a]])
+
+        with tempfile.TemporaryDirectory() as cacheDir:
+            self.assertNotEqual(CompiledRuleSet.getCachePath(*first, cacheDir),
+            CompiledRuleSet.getCachePath(*second, cacheDir))
+
+    def test_sameContentSharesPath(self) -> None:
+        a, b = (TileRegistry.get(f"test#tile{i}") for i in range(2))
+
+        with tempfile.TemporaryDirectory() as cacheDir:
+            self.assertEqual(CompiledRuleSet.getCachePath(*learnAdjacency([[a, b]]), cacheDir),
+            CompiledRuleSet.getCachePath(*learnAdjacency([[a, b]]), cacheDir))
+
+    def test_cachedTableMatchesCompiled(self) -> None:
+        tilesProvider, rulesProvider = DefaultTileFactory(), DefaultTileRuleSetFactory()
+
+        with tempfile.TemporaryDirectory() as cacheDir:
+            compiled: CompiledRuleSet = CompiledRuleSet.compile(tilesProvider, rulesProvider)
+            CompiledRuleSet.compileCached(tilesProvider, rulesProvider, cacheDir)
+            cached: CompiledRuleSet = CompiledRuleSet.compileCached(tilesProvider, rulesProvider, cacheDir)
+            self.assertEqual(cached.tiles, compiled.tiles)
+            self.assertEqual(cached.masks, compiled.masks)
+
+if __name__ == "__main__":
+    unittest.main()
\ No newline at end of file
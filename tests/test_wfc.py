@@ -0,0 +1,59 @@
+import unittest
+
+import rules
+from rules import CompiledRuleSet
+from wfc import WaveFunctionCollapse
+
+BACKENDS: tuple[str, ...] = (WaveFunctionCollapse.PYTHON_BACKEND, WaveFunctionCollapse.NUMPY_BACKEND)
+
+def getInvalidPairs(compiledRules: CompiledRuleSet, ids: list[list[int]]) -> int:
+    invalid: int = 0
+    for row in range(len(ids)):
+        for col in range(len(ids[row])):
+            if (col + 1 < len(ids[row]) and not (compiledRules.getMask(CompiledRuleSet.RIGHT, ids[row][col]) >> ids[row][col + 1]) & 1):
+                invalid += 1
+            if (row + 1 < len(ids) and not (compiledRules.getMask(CompiledRuleSet.DOWN, ids[row][col]) >> ids[row + 1][col]) & 1):
+                invalid += 1
+
+    return invalid
+
+class TestWaveFunctionCollapse(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.rules: CompiledRuleSet = CompiledRuleSet.compile(*rules.getProviders("default"))
+
+    def test_solvedGridsAreValid(self) -> None:
+        for backend in BACKENDS:
+            for seed in range(5):
+                algo: WaveFunctionCollapse = WaveFunctionCollapse.fromRules(self.rules, seed=seed, backend=backend,
+                maxBacktracks=32, width=12, height=9)
+                self.assertTrue(algo.solve(100))
+                self.assertEqual(getInvalidPairs(self.rules, algo.getIds()), 0)
+
+    def test_backtrackingKeepsPinsMadeWhileSolving(self) -> None:
+        # a decision made before the pin must not be undone from under it
+        for backend in BACKENDS:
+            for seed in range(40):
+                algo: WaveFunctionCollapse = WaveFunctionCollapse.fromRules(self.rules, 8, seed, backend=backend,
+                maxBacktracks=64)
+                for _ in range(5):
+                    algo.wfc()
+
+                ROW, COL = next((r, c) for r in range(8) for c in range(8) if algo.getTile(r, c) == None)
+                tileIndex: int = algo.getCell(ROW, COL).options[-1]
+                algo.pin(ROW, COL, tileIndex)
+                algo._backtrack()
+
+                if (algo.solve(10)):
+                    self.assertEqual(getInvalidPairs(self.rules, algo.getIds()), 0, (backend, seed))
+                    self.assertEqual(algo.getIds()[ROW][COL], tileIndex, (backend, seed))
+
+    def test_pinOutsideGridRaises(self) -> None:
+        algo: WaveFunctionCollapse = WaveFunctionCollapse.fromRules(self.rules, 5, 0)
+        with self.assertRaises(ValueError):
+            algo.pin(5, 0, 0)
+        with self.assertRaises(ValueError):
+            algo.restrict(0, -1, self.rules.allMask)
+
+if __name__ == "__main__":
+    unittest.main()
\ No newline at end of file
@@ -1,13 +1,20 @@
-import pygame
 import abc
+from typing import TYPE_CHECKING
+
+if (TYPE_CHECKING):
+    import pygame
 
 class Tile:
+    # a tile is identified only by its image path, the image itself is decoded by
+    # TileRegistry the first time something renders it so solving never needs pygame
     def __init__(self, imgPath: str) -> None:
-        self._img: pygame.Surface = pygame.image.load(imgPath)
         self._imgPath = imgPath
 
-    def getImg(self) -> pygame.Surface:
-        return self._img
+    def getImgPath(self) -> str:
+        return self._imgPath
+
+    def getImg(self) -> 'pygame.Surface':
+        return TileRegistry.getImage(self._imgPath)
 
     def __eq__(self, compare: object) -> bool:
         if (type(compare) != Tile):
@@ -24,11 +31,70 @@ class Tile:
     def __repr__(self) -> str:
         return self.__str__()
 
+class TileRegistry:
+    # process wide flyweight cache, every image is decoded once per path and reused by all factories
+    _tiles: dict[str, Tile] = {}
+    _images: dict[str, 'pygame.Surface'] = {}
+
+    hits: int = 0
+    misses: int = 0
+    imageLoads: int = 0
+
+    @staticmethod
+    def get(imgPath: str) -> Tile:
+        if (imgPath in TileRegistry._tiles):
+            TileRegistry.hits += 1
+            return TileRegistry._tiles[imgPath]
+
+        TileRegistry.misses += 1
+        tile = Tile(imgPath)
+        TileRegistry._tiles[imgPath] = tile
+
+        return tile
+
+    @staticmethod
+    def getImage(imgPath: str) -> 'pygame.Surface':
+        if (imgPath in TileRegistry._images):
+            return TileRegistry._images[imgPath]
+
+        # imported here so only code that renders depends on pygame
+        import pygame
+
+        TileRegistry.imageLoads += 1
+        img: pygame.Surface = pygame.image.load(imgPath)
+        TileRegistry._images[imgPath] = img
+
+        return img
+
+    @staticmethod
+    def preload(imgPaths: list[str], loadImages: bool = True) -> None:
+        for imgPath in imgPaths:
+            TileRegistry.get(imgPath)
+            if (loadImages):
+                TileRegistry.getImage(imgPath)
+
+    @staticmethod
+    def clear() -> None:
+        TileRegistry._tiles.clear()
+        TileRegistry._images.clear()
+        TileRegistry.hits = 0
+        TileRegistry.misses = 0
+        TileRegistry.imageLoads = 0
+
+    @staticmethod
+    def getStats() -> dict[str, int]:
+        return {"tiles": len(TileRegistry._tiles), "hits": TileRegistry.hits, "misses": TileRegistry.misses,
+        "imageLoads": TileRegistry.imageLoads}
+
 class ITilesProvider(abc.ABC):
     @abc.abstractmethod
     def provide() -> list[Tile]:
         ...
 
+    def getWeights(self) -> dict[Tile, float]:
+        # relative frequency of each tile when a cell collapses, every tile is equally likely unless overridden
+        return {tile: 1.0 for tile in self.provide()}
+
 DEFAULT_TILES_PATH = './tiles/default/'
 class DefaultTileFactory(ITilesProvider):
     #region Tile IDs
@@ -39,9 +105,6 @@ class DefaultTileFactory(ITilesProvider):
     LEFT_ID: int = 4
     #endregion
 
-    # for flyweight pattern
-    _createdTiles: dict[int, Tile] = {}
-
     def provide(self) -> list[Tile]:
         tiles: list[Tile] = []
 
@@ -55,28 +118,23 @@ class DefaultTileFactory(ITilesProvider):
 
     @staticmethod
     def createBlank() -> Tile:
-        return DefaultTileFactory._createdTiles.get(DefaultTileFactory.BLANK_ID,
-        Tile(f'{DEFAULT_TILES_PATH}blank.png'))
+        return TileRegistry.get(f'{DEFAULT_TILES_PATH}blank.png')
     
     @staticmethod
     def createUp() -> Tile:
-        return DefaultTileFactory._createdTiles.get(DefaultTileFactory.UP_ID,
-        Tile(f'{DEFAULT_TILES_PATH}up.png'))
+        return TileRegistry.get(f'{DEFAULT_TILES_PATH}up.png')
     
     @staticmethod
     def createRight() -> Tile:
-        return DefaultTileFactory._createdTiles.get(DefaultTileFactory.RIGHT_ID,
-        Tile(f'{DEFAULT_TILES_PATH}right.png'))
+        return TileRegistry.get(f'{DEFAULT_TILES_PATH}right.png')
     
     @staticmethod
     def createDown() -> Tile:
-        return DefaultTileFactory._createdTiles.get(DefaultTileFactory.DOWN_ID,
-        Tile(f'{DEFAULT_TILES_PATH}down.png'))
+        return TileRegistry.get(f'{DEFAULT_TILES_PATH}down.png')
     
     @staticmethod
     def createLeft() -> Tile:
-        return DefaultTileFactory._createdTiles.get(DefaultTileFactory.LEFT_ID,
-        Tile(f'{DEFAULT_TILES_PATH}left.png'))
+        return TileRegistry.get(f'{DEFAULT_TILES_PATH}left.png')
     
 LANDSCAPE_TILES_PATH = './tiles/landscape/'
 class LandscapeTileFactory(ITilesProvider):
@@ -94,9 +152,6 @@ class LandscapeTileFactory(ITilesProvider):
     WATER_2_ID: int = 7
     #endregion
 
-    # for flyweight pattern
-    _createdTiles: dict[int, Tile] = {}
-
     def provide(self) -> list[Tile]:
         tiles: list[Tile] = []
 
@@ -111,42 +166,45 @@ class LandscapeTileFactory(ITilesProvider):
 
         return tiles
 
+    def getWeights(self) -> dict[Tile, float]:
+        weights: dict[Tile, float] = super().getWeights()
+
+        # at equal weights flowers and forests cover far more of the map than the grass around them
+        weights[LandscapeTileFactory.createFlower1()] = 0.5
+        weights[LandscapeTileFactory.createFlower2()] = 0.5
+        weights[LandscapeTileFactory.createLightForest1()] = 0.25
+        weights[LandscapeTileFactory.createLightForest2()] = 0.25
+
+        return weights
+
     @staticmethod
     def createGrass1() -> Tile:
-        return LandscapeTileFactory._createdTiles.get(LandscapeTileFactory.GRASS_1_ID,
-        Tile(f'{LANDSCAPE_TILES_PATH}grass1.png'))
+        return TileRegistry.get(f'{LANDSCAPE_TILES_PATH}grass1.png')
     
     @staticmethod
     def createGrass2() -> Tile:
-        return LandscapeTileFactory._createdTiles.get(LandscapeTileFactory.GRASS_2_ID,
-        Tile(f'{LANDSCAPE_TILES_PATH}grass2.png'))
+        return TileRegistry.get(f'{LANDSCAPE_TILES_PATH}grass2.png')
     
     @staticmethod
     def createFlower1() -> Tile:
-        return LandscapeTileFactory._createdTiles.get(LandscapeTileFactory.FLOWER_1_ID,
-        Tile(f'{LANDSCAPE_TILES_PATH}flower1.png'))
+        return TileRegistry.get(f'{LANDSCAPE_TILES_PATH}flower1.png')
     
     @staticmethod
     def createFlower2() -> Tile:
-        return LandscapeTileFactory._createdTiles.get(LandscapeTileFactory.FLOWER_2_ID,
-        Tile(f'{LANDSCAPE_TILES_PATH}flower2.png'))
+        return TileRegistry.get(f'{LANDSCAPE_TILES_PATH}flower2.png')
     
     @staticmethod
     def createLightForest1() -> Tile:
-        return LandscapeTileFactory._createdTiles.get(LandscapeTileFactory.LIGHT_FOREST_1_ID,
-        Tile(f'{LANDSCAPE_TILES_PATH}lightForest1.png'))
+        return TileRegistry.get(f'{LANDSCAPE_TILES_PATH}lightForest1.png')
     
     @staticmethod
     def createLightForest2() -> Tile:
-        return LandscapeTileFactory._createdTiles.get(LandscapeTileFactory.LIGHT_FOREST_2_ID,
-        Tile(f'{LANDSCAPE_TILES_PATH}lightForest2.png'))
+        return TileRegistry.get(f'{LANDSCAPE_TILES_PATH}lightForest2.png')
     
     @staticmethod
     def createWater1() -> Tile:
-        return LandscapeTileFactory._createdTiles.get(LandscapeTileFactory.WATER_1_ID,
-        Tile(f'{LANDSCAPE_TILES_PATH}water1.png'))
+        return TileRegistry.get(f'{LANDSCAPE_TILES_PATH}water1.png')
     
     @staticmethod
     def createWater2() -> Tile:
-        return LandscapeTileFactory._createdTiles.get(LandscapeTileFactory.WATER_2_ID,
-        Tile(f'{LANDSCAPE_TILES_PATH}water2.png'))
\ No newline at end of file
+        return TileRegistry.get(f'{LANDSCAPE_TILES_PATH}water2.png')
\ No newline at end of file
@@ -1,129 +1,782 @@
-import sys
+import time
+import heapq
+import bisect
 import random as rand
 from enum import Enum
+from array import array
+from typing import TYPE_CHECKING
 
 from tile import Tile, ITilesProvider
-from rules import TileRuleSet, IRulesProvider
+from rules import TileRuleSet, IRulesProvider, CompiledRuleSet
+from instrumentation import Instrumentation
+
+if (TYPE_CHECKING):
+    import numpy as np
+
+class WFCStats:
+    def __init__(self) -> None:
+        self.contradictions: int = 0
+        self.backtracks: int = 0
+        self.restarts: int = 0
+        self.collapses: int = 0
+        # cells (or, for the numpy backend, windows) whose options were propagated to their neighbours
+        self.propagations: int = 0
+        # contradictions recovered from by re-rolling the cells around them instead of restarting
+        self.rerolls: int = 0
+
+    def asDict(self) -> dict[str, int]:
+        return dict(vars(self))
+
+    def __str__(self) -> str:
+        return str(self.asDict())
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+class ContradictionHistory:
+    # where contradictions happen on a grid and which collapses set them off, kept across restarts and resets
+    # so restart policies can deal with the cells that keep failing first
+    def __init__(self, width: int, height: int) -> None:
+        self.width: int = width
+        # contradictions at each cell (where the options ran out), indexed by row * width + col
+        self.counts: array = array('I', [0]) * (width * height)
+        # (row, col, tileIndex) of a collapse -> how many contradictions it set off
+        self.choices: dict[tuple[int, int, int], int] = {}
+        # grids given up on and grids completed, for the expected restarts per map
+        self.restarts: int = 0
+        self.maps: int = 0
+
+    def record(self, ROW: int, COL: int, choice: tuple[int, int, int]) -> None:
+        self.counts[ROW * self.width + COL] += 1
+        self.choices[choice] = self.choices.get(choice, 0) + 1
+
+    def getHotspots(self, count: int) -> list[tuple[int, int, int]]:
+        # (row, col, contradictions) of the count cells that ran out of options most often
+        hotspots: list[int] = heapq.nlargest(count, (i for i in range(len(self.counts)) if self.counts[i] != 0),
+        key=self.counts.__getitem__)
+        return [(i // self.width, i % self.width, self.counts[i]) for i in hotspots]
+
+    def getChoices(self, count: int) -> list[tuple[int, int, int, int]]:
+        # (row, col, tileIndex, contradictions) of the count collapses that set off the most contradictions
+        return [(*choice, contradictions) for choice, contradictions in
+        heapq.nlargest(count, self.choices.items(), key=lambda item: item[1])]
+
+    def getExpectedRestarts(self) -> float | None:
+        # restarts needed per completed map so far, None before any map has been completed
+        if (self.maps == 0):
+            return None
+
+        return self.restarts / self.maps
+
+    def asDict(self, count: int = 10) -> dict:
+        return {"expectedRestartsPerMap": self.getExpectedRestarts(), "hotspots": self.getHotspots(count),
+        "choices": self.getChoices(count)}
+
+    def clear(self) -> None:
+        self.counts[:] = array('I', [0]) * len(self.counts)
+        self.choices.clear()
+        self.restarts = 0
+        self.maps = 0
+
+class CellView:
+    # a snapshot of one cell for debugging, see WaveFunctionCollapse.getCell()
+    __slots__ = ("row", "col", "tile", "options", "entropy")
+
+    def __init__(self, row: int, col: int, tile: Tile | None, options: list[int], entropy: float) -> None:
+        self.row: int = row
+        self.col: int = col
+        self.tile: Tile | None = tile
+        # indexes into the rules' tiles the cell still allows
+        self.options: list[int] = options
+        self.entropy: float = entropy
+
+    def __str__(self) -> str:
+        return f"({self.row}, {self.col}): tile {self.tile}, options {self.options}, entropy {self.entropy:.4f}"
+
+    def __repr__(self) -> str:
+        return self.__str__()
 
 class WaveFunctionCollapse:
+    # (direction, row offset, col offset)
+    _NEIGHBOURS: tuple[tuple[int, int, int], ...] = (
+        (CompiledRuleSet.UP, -1, 0),
+        (CompiledRuleSet.RIGHT, 0, 1),
+        (CompiledRuleSet.DOWN, 1, 0),
+        (CompiledRuleSet.LEFT, 0, -1)
+    )
+
     class WFCIterationResult(Enum):
         COMPLETE = 0,
         CONTRADICTION = 1,
         GENERATING = 2
+
+    #region Backends
+    PYTHON_BACKEND: str = "python"
+    # still collapses one cell at a time, so the overhead of its array operations makes it several times slower
+    # than the python engine at every grid size measured, the driver and CLI don't offer it until it isn't
+    NUMPY_BACKEND: str = "numpy"
+    #endregion
+
+    #region Restart policies
+    # what happens once backtracking can't get past a contradiction: RESTART_POLICY starts the grid over,
+    # HOTSPOTS_POLICY starts it over collapsing the cells that contradicted most so far first, and
+    # REROLL_POLICY clears and solves again only the cells around the contradiction, growing the area
+    # on every further contradiction, before falling back to a restart
+    RESTART_POLICY: str = "restart"
+    HOTSPOTS_POLICY: str = "hotspots"
+    REROLL_POLICY: str = "reroll"
+    #endregion
+
+    # the backend a solver runs on, overridden by each backend's subclass
+    backend: str = PYTHON_BACKEND
+
+    # stored in self.ids for cells that haven't collapsed
+    UNCOLLAPSED_ID: int = 0xFFFF
+    # marks a missing neighbour in the neighbour table
+    _NO_NEIGHBOUR: int = -1
+    # options bitmasks of rule sets with at most this many tiles fit in a typed buffer, larger ones are kept as ints
+    _MAX_TYPED_TILES: int = 64
+
+    def __new__(cls, *args, backend: str = PYTHON_BACKEND, **kwargs) -> 'WaveFunctionCollapse':
+        # backend is keyword only in __init__ and fromRules, so it can never end up in args unseen
+        if (cls is WaveFunctionCollapse and backend == WaveFunctionCollapse.NUMPY_BACKEND):
+            # imported here so numpy is only required when the backend is actually used
+            from wfc_numpy import NumpyWaveFunctionCollapse
+            return super().__new__(NumpyWaveFunctionCollapse)
+
+        if (backend not in (WaveFunctionCollapse.PYTHON_BACKEND, WaveFunctionCollapse.NUMPY_BACKEND)):
+            raise ValueError(f"Unknown backend '{backend}'.")
+
+        return super().__new__(cls)
     
     def __init__(self, tilesProvider: ITilesProvider, rulesProvider: IRulesProvider,
-    gridSize: int, seed: int | None = None) -> None:
+    gridSize: int | None = None, seed: int | None = None, *, backend: str = PYTHON_BACKEND, maxBacktracks: int = 0,
+    width: int | None = None, height: int | None = None, periodicX: bool = False, periodicY: bool = False,
+    restartPolicy: str = RESTART_POLICY) -> None:
         self.possibleTiles: list[Tile] = tilesProvider.provide()
-        self.gridSize: int = gridSize
         self.ruleSet: dict[Tile, TileRuleSet] = rulesProvider.provide()
+        self._setup(CompiledRuleSet.compile(tilesProvider, rulesProvider), *WaveFunctionCollapse._getSize(gridSize, width, height),
+        periodicX, periodicY, seed, maxBacktracks, restartPolicy)
+
+    @staticmethod
+    def fromRules(rules: CompiledRuleSet, gridSize: int | None = None, seed: int | None = None, *,
+    backend: str = PYTHON_BACKEND, maxBacktracks: int = 0, width: int | None = None, height: int | None = None,
+    periodicX: bool = False, periodicY: bool = False, restartPolicy: str = RESTART_POLICY) -> 'WaveFunctionCollapse':
+        # skips the providers entirely, for callers that already hold a compiled rule set
+        algo: WaveFunctionCollapse = WaveFunctionCollapse.__new__(WaveFunctionCollapse, backend=backend)
+        algo.possibleTiles = rules.tiles
+        algo.ruleSet = rules.toRuleSets()
+        algo._setup(rules, *WaveFunctionCollapse._getSize(gridSize, width, height), periodicX, periodicY, seed, maxBacktracks,
+        restartPolicy)
+
+        return algo
+
+    @staticmethod
+    def _getSize(gridSize: int | None, width: int | None, height: int | None) -> tuple[int, int]:
+        # width and height override gridSize, which on its own makes a square grid
+        width = width if width != None else gridSize
+        height = height if height != None else gridSize
+        if (width == None or height == None):
+            raise ValueError("Either gridSize or both width and height are needed.")
+
+        return (width, height) # type: ignore
+
+    def _setup(self, rules: CompiledRuleSet, width: int, height: int, periodicX: bool, periodicY: bool,
+    seed: int | None, maxBacktracks: int, restartPolicy: str) -> None:
+        if (restartPolicy not in (WaveFunctionCollapse.RESTART_POLICY, WaveFunctionCollapse.HOTSPOTS_POLICY,
+        WaveFunctionCollapse.REROLL_POLICY)):
+            raise ValueError(f"Unknown restart policy '{restartPolicy}'.")
+
+        self.width: int = width
+        self.height: int = height
+        # the length of a row, so it matches the side of square grids
+        self.gridSize: int = width
+        # periodic axes wrap around, so the output tiles seamlessly in that direction
+        self.periodicX: bool = periodicX
+        self.periodicY: bool = periodicY
+        self.rules: CompiledRuleSet = rules
 
-        self.grid: list[list[Tile | None]] = []
-        self.entropies: list[list[int]] = []
-        self.options: list[list[list[Tile]]] = []
-        for r in range (gridSize):
-            self.grid.append([])
-            self.entropies.append([])
-            self.options.append([])
+        # how many choices can be undone after contradictions before wfc() gives up and a restart is needed, 0 disables backtracking
+        self.maxBacktracks: int = maxBacktracks
+        self.stats: WFCStats = WFCStats()
+        # per-phase timers and hooks, None keeps wfc() on its untimed path
+        self.instrumentation: Instrumentation | None = None
 
-            for c in range(gridSize):
-                self.grid[r].append(None)
+        self.restartPolicy: str = restartPolicy
+        self.history: ContradictionHistory = ContradictionHistory(width, height)
+        # with REROLL_POLICY, how many times the cells around contradictions are re-rolled before a restart,
+        # and the distance from the contradiction cleared by the first re-roll
+        self.maxRerolls: int = 4
+        self.rerollRadius: int = 2
 
-                self.entropies[r].append(len(self.possibleTiles))
+        # (row, col) -> tile index or allowed bitmask, set through pin() and restrict() and applied again after
+        # every restart() and unsolve() so edits made before or while solving aren't lost
+        self._pinned: dict[tuple[int, int], int] = {}
+        self._restricted: dict[tuple[int, int], int] = {}
 
-                self.options[r].append([])
-                self.options[r][c] = self.possibleTiles.copy()
+        self._reseed(seed)
+        self._prepare()
+        self._allocate()
+        self._initState()
 
+    def reset(self, seed: int | None = None) -> None:
+        # starts over on an empty grid as if the solver had just been built with this seed, pins and stats are
+        # cleared but the compiled rules, the neighbour table and every cell buffer are reused, so it is much
+        # cheaper than building a new solver for the same rules and grid, the contradiction history is kept
+        # so HOTSPOTS_POLICY keeps learning from the maps solved before
+        self._reseed(seed)
+        self.stats = WFCStats()
+        self.clearPins()
+        self._initState()
+
+    def _reseed(self, seed: int | None) -> None:
         self.rand = rand.Random(seed)
 
+    def _prepare(self) -> None:
+        # everything that only depends on the rules and the grid's shape, built once and kept across restarts
+        # neighbour of each cell in each direction as a flat index, at (row * width + col) * 4 + direction, edges are
+        # resolved here (wrapped around on periodic axes, _NO_NEIGHBOUR otherwise) so propagation never checks bounds
+        self._neighbourTable: array = array('i', [WaveFunctionCollapse._NO_NEIGHBOUR]) * (self.width * self.height * 4)
+        for direction, rowOffset, colOffset in WaveFunctionCollapse._NEIGHBOURS:
+            # filled a row at a time, every row shares the same neighbouring columns
+            cols: list[int] = [WaveFunctionCollapse._getNeighbourIndex(COL + colOffset, self.width, self.periodicX)
+            for COL in range(self.width)]
+            neighbours: array = array('i')
+            for ROW in range(self.height):
+                r: int = WaveFunctionCollapse._getNeighbourIndex(ROW + rowOffset, self.height, self.periodicY)
+                if (r == WaveFunctionCollapse._NO_NEIGHBOUR):
+                    neighbours.extend(array('i', [WaveFunctionCollapse._NO_NEIGHBOUR]) * self.width)
+                else:
+                    neighbours.extend([c if c == WaveFunctionCollapse._NO_NEIGHBOUR else r * self.width + c for c in cols])
+
+            self._neighbourTable[direction::4] = neighbours
+
+    @staticmethod
+    def _getNeighbourIndex(index: int, size: int, periodic: bool) -> int:
+        # the row or col next to another along an axis of size cells, _NO_NEIGHBOUR past a bounded edge
+        if (periodic):
+            return index % size
+
+        return index if 0 <= index < size else WaveFunctionCollapse._NO_NEIGHBOUR
+
+    def restart(self) -> bool:
+        # False if the pinned and restricted cells contradict each other, no restart can solve the grid then
+        self.stats.restarts += 1
+        self.history.restarts += 1
+        self._initState()
+
+        return self._applyConstraints(0, self.height, 0, self.width)
+
+    def _allocate(self) -> None:
+        # every per-cell buffer is flat, indexed by row * width + col, allocated once and refilled in place by
+        # _initState(), so views of them such as getIdBuffer() stay valid across restarts
+        cellCount: int = self.width * self.height
+
+        # tile index of every cell, UNCOLLAPSED_ID until it collapses, self.grid and getTile() are derived from it
+        self.ids: array = array('H', [WaveFunctionCollapse.UNCOLLAPSED_ID]) * cellCount
+        # Shannon entropy of each cell's options, 0 once it has collapsed
+        self.entropies: array = array('d', [0.0]) * cellCount
+        # each cell's options are a bitmask of indexes into self.rules.tiles
+        self.options: array | list[int] = self._getAllOptions(cellCount)
+        # running sums of w and w * log(w) over each cell's options, the entropy is derived from them
+        self._sumWeights: array = array('d', [0.0]) * cellCount
+        self._sumWeightLogWeights: array = array('d', [0.0]) * cellCount
+
+        # worklist of flat indexes of cells whose options changed but haven't been propagated to their neighbours yet
+        self._pending: list[int] = []
+        # min-heap of (entropy, tie breaker, index), entries are lazily discarded when their entropy
+        # no longer matches self.entropies or the cell has collapsed since
+        self._entropyHeap: list[tuple[float, float, int]] = []
+        # undo log of (index, options, entropy, sum of weights, sum of w * log(w)) saved before every change,
+        # only kept when backtracking
+        self._trail: list[tuple[int, int, float, float, float]] = []
+        # (row, col, tileIndex, trail length before the collapse) of every choice that can still be undone
+        self._decisions: list[tuple[int, int, int, int]] = []
+        # cells whose tile was set or cleared during the last wfc() step
+        self.changedCells: list[tuple[int, int]] = []
+
+    def _initState(self) -> None:
+        cellCount: int = self.width * self.height
+        sumWeights: float = sum(self.rules.weights)
+        sumWeightLogWeights: float = sum(self.rules.weightLogWeights)
+        entropy: float = CompiledRuleSet.getEntropy(sumWeights, sumWeightLogWeights)
+
+        self.ids[:] = array('H', [WaveFunctionCollapse.UNCOLLAPSED_ID]) * cellCount
+        self.entropies[:] = array('d', [entropy]) * cellCount
+        self.options[:] = self._getAllOptions(cellCount) # type: ignore
+        self._sumWeights[:] = array('d', [sumWeights]) * cellCount
+        self._sumWeightLogWeights[:] = array('d', [sumWeightLogWeights]) * cellCount
+
+        self._pending.clear()
+        # every cell starts out equal, so the initial heap is built in one go
+        if (self.restartPolicy == WaveFunctionCollapse.HOTSPOTS_POLICY):
+            # cells that contradicted more often sort first among the cells nothing has narrowed yet
+            counts: array = self.history.counts
+            self._entropyHeap[:] = [(entropy, self.rand.random() - counts[i], i) for i in range(cellCount)]
+        else:
+            self._entropyHeap[:] = [(entropy, self.rand.random(), i) for i in range(cellCount)]
+        heapq.heapify(self._entropyHeap)
+
+        self._trail.clear()
+        self._decisions.clear()
+        self._backtracksLeft: int = self.maxBacktracks
+        self._rerollsLeft: int = self.maxRerolls
+        # set once the grid is complete, so it is only counted once in the history
+        self._complete: bool = False
+
+        # the cell that ran out of options in the last contradiction
+        self.contradiction: tuple[int, int] | None = None
+        self.changedCells.clear()
+
+    def _getAllOptions(self, count: int) -> array | list[int]:
+        # count cells that allow every tile, typed when the bitmasks fit in 64 bits
+        if (len(self.rules.tiles) <= WaveFunctionCollapse._MAX_TYPED_TILES):
+            return array('Q', [self.rules.allMask]) * count
+
+        return [self.rules.allMask] * count
+
+    @property
+    def grid(self) -> list[list[Tile | None]]:
+        # a nested copy built from self.ids on every access, getTile() reads a single cell without building it
+        tiles: list[Tile] = self.rules.tiles
+        return [[None if id == WaveFunctionCollapse.UNCOLLAPSED_ID else tiles[id]
+        for id in self.ids[r * self.width:(r + 1) * self.width]] for r in range(self.height)]
+
+    def getTile(self, ROW: int, COL: int) -> Tile | None:
+        id: int = self.ids[WaveFunctionCollapse._twoDimToOneDim(ROW, COL, self.width)]
+        return None if id == WaveFunctionCollapse.UNCOLLAPSED_ID else self.rules.tiles[id]
+
+    def getCell(self, ROW: int, COL: int) -> CellView:
+        index: int = WaveFunctionCollapse._twoDimToOneDim(ROW, COL, self.width)
+        return CellView(ROW, COL, self.getTile(ROW, COL), CompiledRuleSet.maskIndexes(self.options[index]),
+        self.entropies[index])
+
     def wfc(self) -> WFCIterationResult:
-        minEntropy: int = sys.maxsize
-        for r in range(self.gridSize):
-            for c in range(self.gridSize):
-                entropy: int = self.entropies[r][c]
-                if (entropy == 0):
-                    continue
+        self.changedCells.clear()
+        return self._step()
+
+    def step(self, count: int) -> WFCIterationResult:
+        # up to count wfc() steps in one call, changedCells covers all of them
+        self.changedCells.clear()
+
+        result: WaveFunctionCollapse.WFCIterationResult = self.WFCIterationResult.GENERATING
+        for _ in range(count):
+            result = self._step()
+            if (result != self.WFCIterationResult.GENERATING):
+                break
+
+        return result
+
+    def runUntil(self, timeBudget: float) -> WFCIterationResult:
+        # keeps stepping for timeBudget seconds (always at least one step), changedCells covers every step
+        self.changedCells.clear()
+        deadline: float = time.perf_counter() + timeBudget
+
+        while (True):
+            result: WaveFunctionCollapse.WFCIterationResult = self._step()
+            if (result != self.WFCIterationResult.GENERATING or time.perf_counter() >= deadline):
+                return result
+
+    def _step(self) -> WFCIterationResult:
+        if (self.instrumentation != None):
+            return self._instrumentedStep()
+
+        chosen: tuple[int, int] | None = self._selectCell()
+        if (chosen == None):
+            return self._finish()
+
+        ROW, COL = chosen # type: ignore
+        tileIndex: int = self._chooseTile(ROW, COL)
+        if (not self._assign(ROW, COL, tileIndex)):
+            self._recordContradiction(ROW, COL, tileIndex)
+            if (not self._backtrack()):
+                return self.WFCIterationResult.CONTRADICTION
+
+        return self.WFCIterationResult.GENERATING
 
-                if (entropy < minEntropy):
-                    minEntropy = entropy
+    def _instrumentedStep(self) -> WFCIterationResult:
+        # the same step as _step(), with every phase timed and reported to the hooks
+        instrumentation: Instrumentation = self.instrumentation # type: ignore
 
-        if (minEntropy == sys.maxsize):
-            return self.WFCIterationResult.COMPLETE
+        start: float = time.perf_counter()
+        chosen: tuple[int, int] | None = self._selectCell()
+        instrumentation.record(Instrumentation.ENTROPY_SCAN, start)
+        if (chosen == None):
+            return self._finish()
 
-        minEntropyTileIndexes: list[tuple[int, int]] = []
-        for r in range(self.gridSize):
-            for c in range(self.gridSize):
-                if (self.entropies[r][c] == minEntropy):
-                    minEntropyTileIndexes.append((r, c))
+        ROW, COL = chosen # type: ignore
+        start = time.perf_counter()
+        tileIndex: int = self._chooseTile(ROW, COL)
+        instrumentation.record(Instrumentation.CHOOSE_TILE, start)
+        instrumentation.emit(Instrumentation.COLLAPSE_EVENT, ROW, COL, tileIndex)
 
-        chosen: tuple[int, int] = self.rand.choice(minEntropyTileIndexes)
-        if (not self._collapse(chosen[0], chosen[1])):
-            return self.WFCIterationResult.CONTRADICTION
+        start = time.perf_counter()
+        propagated: bool = self._assign(ROW, COL, tileIndex)
+        instrumentation.record(Instrumentation.PROPAGATE, start)
+        instrumentation.emit(Instrumentation.PROPAGATE_EVENT, ROW, COL, propagated)
+
+        if (not propagated):
+            self._recordContradiction(ROW, COL, tileIndex)
+            instrumentation.emit(Instrumentation.CONTRADICTION_EVENT, *self.contradiction) # type: ignore
+
+            start = time.perf_counter()
+            backtracked: bool = self._backtrack()
+            instrumentation.record(Instrumentation.CONTRADICTION, start)
+            if (not backtracked):
+                return self.WFCIterationResult.CONTRADICTION
 
         return self.WFCIterationResult.GENERATING
 
-    def _collapse(self, ROW: int, COL: int) -> bool:
-        self.grid[ROW][COL] = self.rand.choice(self.options[ROW][COL])
-        self.options[ROW][COL] = []
-        self.entropies[ROW][COL] = 0
+    def _finish(self) -> WFCIterationResult:
+        if (not self._complete):
+            self._complete = True
+            self.history.maps += 1
+
+        return self.WFCIterationResult.COMPLETE
+
+    def _recordContradiction(self, ROW: int, COL: int, tileIndex: int) -> None:
+        # (ROW, COL, tileIndex) is the collapse whose propagation ran self.contradiction out of options
+        self.stats.contradictions += 1
+        self.history.record(*self.contradiction, (ROW, COL, tileIndex)) # type: ignore
+
+    def solve(self, maxRestarts: int | None = None) -> bool:
+        while (True):
+            result: WaveFunctionCollapse.WFCIterationResult = self.wfc()
+            if (result == self.WFCIterationResult.COMPLETE):
+                return True
+
+            if (result == self.WFCIterationResult.CONTRADICTION):
+                if (self.reroll()):
+                    continue
+
+                if (maxRestarts != None and self.stats.restarts >= maxRestarts):
+                    return False
+
+                if (not self.restart()):
+                    return False
+
+    def reroll(self) -> bool:
+        # with REROLL_POLICY, clears the cells around the last contradiction so solving can carry on without a
+        # restart, False if the policy is different, the re-rolls are used up or the cleared area contradicts,
+        # a restart() is needed then, the cleared cells are added to changedCells
+        if (self.restartPolicy != WaveFunctionCollapse.REROLL_POLICY or self._rerollsLeft <= 0 or self.contradiction == None):
+            return False
+
+        self._rerollsLeft -= 1
+        self.stats.rerolls += 1
+
+        # each re-roll since the last restart clears a wider area than the one before
+        radius: int = self.rerollRadius * (self.maxRerolls - self._rerollsLeft)
+        ROW, COL = self.contradiction # type: ignore
+        return self._reopenRegion(max(ROW - radius, 0), min(ROW + radius + 1, self.height),
+        max(COL - radius, 0), min(COL + radius + 1, self.width))
+
+    def restrict(self, ROW: int, COL: int, allowed: int) -> bool:
+        # narrows a cell to the tiles in the allowed bitmask before (or while) solving, False on contradiction
+        self._checkCell(ROW, COL)
+        self._forgetDecisions()
+        self._restricted[(ROW, COL)] = self._restricted.get((ROW, COL), self.rules.allMask) & allowed
+        return self._applyRestriction(ROW, COL, allowed)
+
+    def pin(self, ROW: int, COL: int, tileIndex: int) -> bool:
+        # collapses a cell to a chosen tile instead of a random one, False on contradiction,
+        # the pin is kept even when it can't be applied yet, e.g. before unsolve() clears the tile in its way
+        self._checkCell(ROW, COL)
+        if (not 0 <= tileIndex < len(self.rules.tiles)):
+            raise ValueError(f"Tile index {tileIndex} is out of range for {len(self.rules.tiles)} tiles.")
+
+        self._forgetDecisions()
+        self._pinned[(ROW, COL)] = tileIndex
+        return self._applyPin(ROW, COL, tileIndex)
+
+    def unpin(self, ROW: int, COL: int) -> None:
+        # forgets a pin or restriction, the cell keeps its tile until it is restarted or unsolved
+        self._pinned.pop((ROW, COL), None)
+        self._restricted.pop((ROW, COL), None)
+
+    def clearPins(self) -> None:
+        self._pinned.clear()
+        self._restricted.clear()
 
-        # handle up
-        if (ROW != 0):
-            newOptions: list[Tile] = []
-            for option in self.options[ROW - 1][COL]:
-                if (option in self.ruleSet[self.grid[ROW][COL]].getUp() and option in self.options[ROW - 1][COL]): # type: ignore
-                    newOptions.append(option)
+    def _forgetDecisions(self) -> None:
+        # the trail doesn't hold tile ids, so backtracking past a pin or restriction made while solving would give
+        # its cell back all of its options under the tile it already has, the choices made before it become final
+        self._trail.clear()
+        self._decisions.clear()
 
-            newEntropy: int = len(newOptions)
-            if (newEntropy == 0 and len(self.options[ROW - 1][COL]) != 0):
+    def _checkCell(self, ROW: int, COL: int) -> None:
+        # the flat index of a cell outside the grid would land on another cell instead of failing
+        if (not (0 <= ROW < self.height and 0 <= COL < self.width)):
+            raise ValueError(f"Cell ({ROW}, {COL}) is outside the {self.width}x{self.height} grid.")
+
+    def unsolve(self, top: int, left: int, height: int, width: int, maxRestarts: int | None = 100) -> bool:
+        # clears a rectangle of a solved grid and solves only that rectangle again with everything around it fixed,
+        # so an edit costs as much as its own area, cells outside it are expected to be collapsed already
+        bottom: int = min(top + height, self.height)
+        right: int = min(left + width, self.width)
+        top, left = max(top, 0), max(left, 0)
+
+        attempts: int = 0
+        while (True):
+            # reopening involves no choices, if the cells around the rectangle or its pins and restrictions
+            # contradict, every attempt would, same as restart() failing in solve()
+            if (not self._reopenRegion(top, bottom, left, right)):
                 return False
 
-            self.options[ROW - 1][COL] = newOptions
-            self.entropies[ROW - 1][COL] = newEntropy
+            result: WaveFunctionCollapse.WFCIterationResult = self.WFCIterationResult.GENERATING
+            while (result == self.WFCIterationResult.GENERATING):
+                result = self._step()
 
-        # handle right
-        if (COL != self.gridSize - 1):
-            newOptions: list[Tile] = []
-            for option in self.options[ROW][COL + 1]:
-                if (option in self.ruleSet[self.grid[ROW][COL]].getRight() and option in self.options[ROW][COL + 1]): # type: ignore
-                    newOptions.append(option)
+            if (result == self.WFCIterationResult.COMPLETE):
+                return True
 
-            newEntropy: int = len(newOptions)
-            if (newEntropy == 0 and len(self.options[ROW][COL + 1]) != 0):
+            if (maxRestarts != None and attempts >= maxRestarts):
                 return False
 
-            self.options[ROW][COL + 1] = newOptions
-            self.entropies[ROW][COL + 1] = newEntropy
-            
-        # handle down
-        if (ROW != self.gridSize - 1):
-            newOptions: list[Tile] = []
-            for option in self.options[ROW + 1][COL]:
-                if (option in self.ruleSet[self.grid[ROW][COL]].getDown() and option in self.options[ROW + 1][COL]): # type: ignore
-                    newOptions.append(option)
-
-            newEntropy: int = len(newOptions)
-            if (newEntropy == 0 and len(self.options[ROW + 1][COL]) != 0):
+            attempts += 1
+            self.stats.restarts += 1
+            self.history.restarts += 1
+
+    def _reopenRegion(self, top: int, bottom: int, left: int, right: int) -> bool:
+        # decisions made before are outside the rectangle and must never be backtracked into
+        self._forgetDecisions()
+        self._backtracksLeft = self.maxBacktracks
+
+        return self._clearRegion(top, bottom, left, right) and self._applyConstraints(top, bottom, left, right)
+
+    def _applyConstraints(self, top: int, bottom: int, left: int, right: int) -> bool:
+        # restrictions first, they never choose a tile so they can't rule out a pin that would otherwise fit
+        for (r, c), allowed in self._restricted.items():
+            if (top <= r < bottom and left <= c < right and not self._applyRestriction(r, c, allowed)):
                 return False
 
-            self.options[ROW + 1][COL] = newOptions
-            self.entropies[ROW + 1][COL] = newEntropy
-        
-        # handle left
-        if (COL != 0):
-            newOptions: list[Tile] = []
-            for option in self.options[ROW][COL - 1]:
-                if (option in self.ruleSet[self.grid[ROW][COL]].getLeft() and option in self.options[ROW][COL - 1]): # type: ignore
-                    newOptions.append(option)
-
-            newEntropy: int = len(newOptions)
-            if (newEntropy == 0 and len(self.options[ROW][COL - 1]) != 0):
+        for (r, c), tileIndex in self._pinned.items():
+            if (top <= r < bottom and left <= c < right and not self._applyPin(r, c, tileIndex)):
                 return False
 
-            self.options[ROW][COL - 1] = newOptions
-            self.entropies[ROW][COL - 1] = newEntropy
+        return True
+
+    def _clearRegion(self, top: int, bottom: int, left: int, right: int) -> bool:
+        sumWeights: float = sum(self.rules.weights)
+        sumWeightLogWeights: float = sum(self.rules.weightLogWeights)
+        entropy: float = CompiledRuleSet.getEntropy(sumWeights, sumWeightLogWeights)
+        width: int = right - left
+
+        for r in range(top, bottom):
+            start: int = WaveFunctionCollapse._twoDimToOneDim(r, left, self.width)
+            self.ids[start:start + width] = array('H', [WaveFunctionCollapse.UNCOLLAPSED_ID]) * width
+            self.options[start:start + width] = self._getAllOptions(width) # type: ignore
+            self.entropies[start:start + width] = array('d', [entropy]) * width
+            self._sumWeights[start:start + width] = array('d', [sumWeights]) * width
+            self._sumWeightLogWeights[start:start + width] = array('d', [sumWeightLogWeights]) * width
+            self.changedCells.extend((r, c) for c in range(left, right))
+            for index in range(start, start + width):
+                self._pushEntropy(index)
+
+        # the fixed cells around the rectangle narrow it down the same way a collapse would
+        for ROW in range(top, bottom):
+            for COL in range(left, right):
+                base: int = WaveFunctionCollapse._twoDimToOneDim(ROW, COL, self.width) * 4
+                for neighbour in self._neighbourTable[base:base + 4]:
+                    if (neighbour != WaveFunctionCollapse._NO_NEIGHBOUR and not (top <= neighbour // self.width < bottom
+                    and left <= neighbour % self.width < right)):
+                        self._pending.append(neighbour)
+
+        return self._propagate()
+
+    def _applyRestriction(self, ROW: int, COL: int, allowed: int) -> bool:
+        index: int = WaveFunctionCollapse._twoDimToOneDim(ROW, COL, self.width)
+        options: int = self.options[index]
+        newOptions: int = options & allowed
+        if (newOptions == options):
+            return True
+
+        if (newOptions == 0):
+            self.contradiction = (ROW, COL)
+            return False
+
+        self._record(index)
+        self.options[index] = newOptions
+        if (self.ids[index] == WaveFunctionCollapse.UNCOLLAPSED_ID):
+            self._updateEntropy(index, options, newOptions)
+
+        self._pending.append(index)
+        return self._propagate()
+
+    def _applyPin(self, ROW: int, COL: int, tileIndex: int) -> bool:
+        index: int = WaveFunctionCollapse._twoDimToOneDim(ROW, COL, self.width)
+        if (not (self.options[index] >> tileIndex) & 1):
+            self.contradiction = (ROW, COL)
+            return False
+
+        self._record(index)
+        self.ids[index] = tileIndex
+        self.changedCells.append((ROW, COL))
+        self.options[index] = 1 << tileIndex
+        self.entropies[index] = 0
+
+        self._pending.append(index)
+        return self._propagate()
+
+    def getIds(self) -> list[list[int]]:
+        # indexes into self.rules.tiles, -1 for cells that haven't collapsed
+        return [[-1 if id == WaveFunctionCollapse.UNCOLLAPSED_ID else id
+        for id in self.ids[r * self.width:(r + 1) * self.width]] for r in range(self.height)]
+
+    def getIdBuffer(self) -> memoryview:
+        # zero-copy view of self.ids, it stays valid across restarts and resets, and changes along with the solver
+        return memoryview(self.ids)
+
+    def getIdArray(self) -> 'np.ndarray':
+        # zero-copy (height, width) uint16 view of self.ids
+        import numpy as np
+        return np.frombuffer(self.ids, dtype=np.uint16).reshape(self.height, self.width)
+
+    def _chooseTile(self, ROW: int, COL: int) -> int:
+        # weighted choice, a binary search of the cell's cumulative weight table
+        indexes, cumulative = self.rules.getCumulativeWeights(self.options[ROW * self.width + COL])
+        return indexes[bisect.bisect_right(cumulative, self.rand.random() * cumulative[-1])]
+
+    def _assign(self, ROW: int, COL: int, tileIndex: int) -> bool:
+        # collapses a cell to a chosen tile as a decision that can be backtracked, then propagates it
+        self.stats.collapses += 1
+        if (self.maxBacktracks != 0):
+            self._decisions.append((ROW, COL, tileIndex, len(self._trail)))
+
+        index: int = ROW * self.width + COL
+        self._record(index)
+        self.ids[index] = tileIndex
+        self.changedCells.append((ROW, COL))
+        self.options[index] = 1 << tileIndex
+        self.entropies[index] = 0
+
+        self._pending.append(index)
+        return self._propagate()
+
+    def _propagate(self) -> bool:
+        neighbourTable: array = self._neighbourTable
+        optionsBuffer: array | list[int] = self.options
+        ids: array = self.ids
+        pending: list[int] = self._pending
+        getSupport = self.rules.getSupport
+        # looked up once instead of for every neighbour
+        noNeighbour: int = WaveFunctionCollapse._NO_NEIGHBOUR
+        uncollapsedId: int = WaveFunctionCollapse.UNCOLLAPSED_ID
+        while (len(pending) != 0):
+            index: int = pending.pop()
+            options: int = optionsBuffer[index]
+            self.stats.propagations += 1
+
+            base: int = index * 4
+            for direction in range(4):
+                neighbour: int = neighbourTable[base + direction]
+                if (neighbour == noNeighbour):
+                    continue
+
+                neighbourOptions: int = optionsBuffer[neighbour]
+                newOptions: int = neighbourOptions & getSupport(direction, options)
+                if (newOptions == neighbourOptions):
+                    continue
+
+                if (newOptions == 0):
+                    self.contradiction = divmod(neighbour, self.width)
+                    pending.clear()
+                    return False
+
+                self._record(neighbour)
+                optionsBuffer[neighbour] = newOptions
+                if (ids[neighbour] == uncollapsedId):
+                    self._updateEntropy(neighbour, neighbourOptions, newOptions)
+
+                pending.append(neighbour)
 
         return True
+
+    def _backtrack(self) -> bool:
+        while (self._backtracksLeft > 0 and len(self._decisions) != 0):
+            self._backtracksLeft -= 1
+            self.stats.backtracks += 1
+
+            ROW, COL, tileIndex, trailLength = self._decisions.pop()
+            index: int = ROW * self.width + COL
+            self.ids[index] = WaveFunctionCollapse.UNCOLLAPSED_ID
+            self._undo(trailLength)
+            self.changedCells.append((ROW, COL))
+
+            # the choice led to a contradiction so rule it out, if nothing is left the choice before it was wrong too
+            options: int = self.options[index]
+            newOptions: int = options & ~(1 << tileIndex)
+            if (newOptions == 0):
+                continue
+
+            self._record(index)
+            self.options[index] = newOptions
+            self._updateEntropy(index, options, newOptions)
+
+            self._pending.append(index)
+            if (self._propagate()):
+                return True
+
+        return False
+
+    def _record(self, index: int) -> None:
+        if (self.maxBacktracks != 0):
+            self._trail.append((index, self.options[index], self.entropies[index],
+            self._sumWeights[index], self._sumWeightLogWeights[index]))
+
+    def _undo(self, trailLength: int) -> None:
+        while (len(self._trail) > trailLength):
+            index, options, entropy, sumWeights, sumWeightLogWeights = self._trail.pop()
+            self.options[index] = options
+            self.entropies[index] = entropy
+            self._sumWeights[index] = sumWeights
+            self._sumWeightLogWeights[index] = sumWeightLogWeights
+            self._pushEntropy(index)
+
+    def _updateEntropy(self, index: int, options: int, newOptions: int) -> None:
+        # options is what the cell had before it was narrowed to newOptions
+        weights: list[float] = self.rules.weights
+        weightLogWeights: list[float] = self.rules.weightLogWeights
+        removed: int = options & ~newOptions
+
+        if (removed.bit_count() < newOptions.bit_count()):
+            sumWeights: float = self._sumWeights[index]
+            sumWeightLogWeights: float = self._sumWeightLogWeights[index]
+            for tileIndex in CompiledRuleSet.maskIndexes(removed):
+                sumWeights -= weights[tileIndex]
+                sumWeightLogWeights -= weightLogWeights[tileIndex]
+        else:
+            # fewer options are left than were removed, so summing them is cheaper and drops any rounding error
+            sumWeights = 0.0
+            sumWeightLogWeights = 0.0
+            for tileIndex in CompiledRuleSet.maskIndexes(newOptions):
+                sumWeights += weights[tileIndex]
+                sumWeightLogWeights += weightLogWeights[tileIndex]
+
+        self._sumWeights[index] = sumWeights
+        self._sumWeightLogWeights[index] = sumWeightLogWeights
+        self.entropies[index] = CompiledRuleSet.getEntropy(sumWeights, sumWeightLogWeights)
+        self._pushEntropy(index)
+
+    def _pushEntropy(self, index: int) -> None:
+        # a cell with a single option left has an entropy of 0 but still has to be collapsed
+        if (self.ids[index] != WaveFunctionCollapse.UNCOLLAPSED_ID):
+            return
+
+        # the seeded tie breaker keeps the choice between equal entropies random but reproducible
+        heapq.heappush(self._entropyHeap, (self.entropies[index], self.rand.random(), index))
+
+    def _selectCell(self) -> tuple[int, int] | None:
+        return self._popMinEntropy()
+
+    def _popMinEntropy(self) -> tuple[int, int] | None:
+        while (len(self._entropyHeap) != 0):
+            entropy, _, index = heapq.heappop(self._entropyHeap)
+            if (entropy == self.entropies[index] and self.ids[index] == WaveFunctionCollapse.UNCOLLAPSED_ID):
+                return divmod(index, self.width)
+
+        return None
     
     @staticmethod
-    def _twoDimToOneDim(row: int, col: int, gridSize: int):
+    def _twoDimToOneDim(row: int, col: int, gridSize: int) -> int:
         return row * gridSize + col
\ No newline at end of file
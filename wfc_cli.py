@@ -0,0 +1,63 @@
+import sys
+import json
+import argparse
+
+import rules
+import export
+from wfc import WaveFunctionCollapse
+from instrumentation import Instrumentation
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Generate a grid without rendering it and print the solved tile IDs.")
+    parser.add_argument("--size", type=int, default=None, help="width and height of a square grid")
+    parser.add_argument("--width", type=int, default=None, help="overrides --size")
+    parser.add_argument("--height", type=int, default=None, help="overrides --size")
+    parser.add_argument("--periodic-x", action="store_true", help="wrap the left and right edges around")
+    parser.add_argument("--periodic-y", action="store_true", help="wrap the top and bottom edges around")
+    parser.add_argument("--tile-set", default="default", choices=sorted(rules.TILE_SETS))
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--max-backtracks", type=int, default=64)
+    parser.add_argument("--max-restarts", type=int, default=None)
+    parser.add_argument("--restart-policy", default=WaveFunctionCollapse.RESTART_POLICY,
+    choices=[WaveFunctionCollapse.RESTART_POLICY, WaveFunctionCollapse.HOTSPOTS_POLICY, WaveFunctionCollapse.REROLL_POLICY])
+    parser.add_argument("--json", action="store_true", help="print the tile paths, grid and stats as JSON")
+    parser.add_argument("--output", default=None, help="also save the grid, as .raw, .npy or .png by extension")
+    parser.add_argument("--trace", default=None, help="time every phase and write a Chrome trace to this file")
+    args = parser.parse_args()
+    if (args.size == None and (args.width == None or args.height == None)):
+        parser.error("either --size or both --width and --height are required")
+
+    tilesProvider, rulesProvider = rules.getProviders(args.tile_set)
+    algo = WaveFunctionCollapse(tilesProvider, rulesProvider, args.size, args.seed,
+    maxBacktracks=args.max_backtracks, width=args.width, height=args.height,
+    periodicX=args.periodic_x, periodicY=args.periodic_y, restartPolicy=args.restart_policy)
+    if (args.trace != None):
+        algo.instrumentation = Instrumentation(trace=True)
+
+    solved: bool = algo.solve(args.max_restarts)
+    if (algo.instrumentation != None):
+        algo.instrumentation.saveChromeTrace(args.trace)
+        print(f"Phases: {algo.instrumentation}", file=sys.stderr)
+
+    if (not solved):
+        print(f"Gave up after {algo.stats.restarts} restarts.", file=sys.stderr)
+        return 1
+
+    if (args.output != None):
+        export.save(args.output, algo.getIdBuffer(), algo.width, algo.rules.tiles)
+
+    if (args.json):
+        print(json.dumps({
+            "tiles": [tile.getImgPath() for tile in algo.rules.tiles],
+            "grid": algo.getIds(),
+            "stats": algo.stats.asDict(),
+            "contradictions": algo.history.asDict()
+        }))
+    else:
+        for row in algo.getIds():
+            print(" ".join(str(id) for id in row))
+
+    return 0
+
+if (__name__ == "__main__"):
+    sys.exit(main())
@@ -5,6 +5,7 @@ import time
 import tile
 import rules
 from wfc import WaveFunctionCollapse
+from background import BackgroundSolver, SolverSnapshot
 
 GRID_SIZE: int = int(input("What size do you want the grid to be?\n"))
 DELAY: float = int(float(input("What delay do you want when generating tiles (ms)?\n")))
@@ -13,6 +14,11 @@ TILE_SET: str = input("What tile set do you want to use (default OR landscape)?\
 SCREEN_WIDTH: int = 600
 SCREEN_HEIGHT: int = 600
 
+MAX_BACKTRACKS: int = 64
+# contradictions re-roll the cells around them, so the screen is only cleared when that doesn't work
+RESTART_POLICY: str = WaveFunctionCollapse.REROLL_POLICY
+FPS: int = 60
+
 screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption('Wave Function Collapse')
 
@@ -23,25 +29,37 @@ TILE_HEIGHT: int = SCREEN_HEIGHT // GRID_SIZE
 # drawRandTiles()
 tilesProvider: tile.ITilesProvider
 rulesProvider: rules.IRulesProvider
-if (TILE_SET == "default"):
-    tilesProvider = tile.DefaultTileFactory()
-    rulesProvider = rules.DefaultTileRuleSetFactory()
-
-elif (TILE_SET == "landscape"):
-    tilesProvider = tile.LandscapeTileFactory()
-    rulesProvider = rules.LandscapeTileRuleSetFactory()
-
-else:
+if (TILE_SET not in rules.TILE_SETS):
     print("INVALID TILESET PROVIDED.")
     sys.exit()
 
-algo = WaveFunctionCollapse(tilesProvider, rulesProvider, GRID_SIZE)
+tilesProvider, rulesProvider = rules.getProviders(TILE_SET)
+
+algo = WaveFunctionCollapse(tilesProvider, rulesProvider, GRID_SIZE, maxBacktracks=MAX_BACKTRACKS,
+restartPolicy=RESTART_POLICY)
+
+# every tile is scaled once up front instead of on every frame
+scaledTiles: dict[tile.Tile, pygame.Surface] = {}
+for possibleTile in algo.rules.tiles:
+    scaledTiles[possibleTile] = pygame.transform.scale(possibleTile.getImg(), (TILE_WIDTH, TILE_HEIGHT)).convert_alpha()
 #endregion
 
+def startSolver() -> BackgroundSolver | None:
+    # without a delay there's nothing to watch step by step, so the solve runs at full speed on its own thread
+    if (DELAY != 0):
+        return None
+
+    solver = BackgroundSolver(algo)
+    solver.start()
+
+    return solver
+
 print("Generating...")
 
 isGenerationDone: bool = False
 genStartTime: float = time.time()
+solver: BackgroundSolver | None = startSolver()
+clock = pygame.time.Clock()
 
 running: bool = True
 while running:
@@ -52,32 +70,61 @@ while running:
         if (event.type == pygame.MOUSEBUTTONDOWN):
             if (isGenerationDone):
                 print("Regenerating...")
-                algo = WaveFunctionCollapse(tilesProvider, rulesProvider, GRID_SIZE)
+                if (solver != None):
+                    solver.stop()
+
+                # the solver and its compiled rules are reused, only the grid is cleared
+                algo.reset()
+                solver = startSolver()
                 
                 isGenerationDone = False
                 genStartTime = time.time()
                 screen.fill((0, 0, 0))
-
-    result: WaveFunctionCollapse.WFCIterationResult = algo.wfc()
-    if (result == WaveFunctionCollapse.WFCIterationResult.COMPLETE):
-        if (not isGenerationDone):
-            print(f"Done. Generation (and displaying) took {time.time() - genStartTime} seconds.")
-            isGenerationDone = True
-
-    elif (result == WaveFunctionCollapse.WFCIterationResult.CONTRADICTION):
-        print("CONTRADICTION! Restarting WFC.")
-        algo = WaveFunctionCollapse(tilesProvider, rulesProvider, GRID_SIZE)
-        screen.fill((0, 0, 0))
-    
-    for r in range(GRID_SIZE):
-        for c in range(GRID_SIZE):
-            if (algo.grid[r][c] == None):
-                continue
-
-            screen.blit(pygame.transform.scale(algo.grid[r][c].getImg(), # type: ignore
-            (TILE_WIDTH, TILE_HEIGHT)), (TILE_WIDTH * c, TILE_HEIGHT * r))
-    pygame.display.flip()
-
-    pygame.time.wait(DELAY)
+                pygame.display.flip()
+
+    snapshots: list[SolverSnapshot]
+    if (solver == None):
+        result: WaveFunctionCollapse.WFCIterationResult = algo.wfc()
+        if (result == WaveFunctionCollapse.WFCIterationResult.CONTRADICTION and algo.reroll()):
+            result = WaveFunctionCollapse.WFCIterationResult.GENERATING
+        snapshots = [SolverSnapshot(result, [(r, c, algo.getTile(r, c)) for r, c in algo.changedCells], algo.stats.asDict())]
+        if (result == WaveFunctionCollapse.WFCIterationResult.CONTRADICTION):
+            algo.restart()
+    else:
+        snapshots = solver.getSnapshots()
+
+    # only the cells that changed since the last frame are redrawn
+    dirtyRects: list[pygame.Rect] = []
+    for snapshot in snapshots:
+        if (snapshot.result == WaveFunctionCollapse.WFCIterationResult.COMPLETE):
+            if (not isGenerationDone):
+                print(f"Done. Generation (and displaying) took {time.time() - genStartTime} seconds.")
+                print(f"Expected restarts per map so far: {algo.history.getExpectedRestarts()}")
+                isGenerationDone = True
+
+        elif (snapshot.result == WaveFunctionCollapse.WFCIterationResult.CONTRADICTION):
+            print(f"CONTRADICTION! Restarting WFC. {snapshot.stats}")
+            screen.fill((0, 0, 0))
+            dirtyRects = [screen.get_rect()]
+            continue
+
+        for r, c, cellTile in snapshot.changedCells:
+            rect = pygame.Rect(TILE_WIDTH * c, TILE_HEIGHT * r, TILE_WIDTH, TILE_HEIGHT)
+            if (cellTile == None):
+                screen.fill((0, 0, 0), rect)
+            else:
+                screen.blit(scaledTiles[cellTile], rect)
+
+            dirtyRects.append(rect)
+
+    pygame.display.update(dirtyRects)
+
+    if (solver == None):
+        pygame.time.wait(DELAY)
+    else:
+        clock.tick(FPS)
+
+if (solver != None):
+    solver.stop()
 
 pygame.quit()
\ No newline at end of file
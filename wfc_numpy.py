@@ -0,0 +1,297 @@
+import heapq
+from array import array
+
+import numpy as np
+
+from rules import CompiledRuleSet
+from wfc import WaveFunctionCollapse, CellView
+
+# a window axis is a slice while it lies inside the grid and an array of wrapped indexes once it crosses a periodic edge
+Axis = slice | np.ndarray
+
+class NumpyWaveFunctionCollapse(WaveFunctionCollapse):
+    backend: str = WaveFunctionCollapse.NUMPY_BACKEND
+
+    def _reseed(self, seed: int | None) -> None:
+        self.rand: np.random.Generator = np.random.default_rng(seed)
+
+    def _prepare(self) -> None:
+        tileCount: int = len(self.rules.tiles)
+        # compatibilities[direction, tile] is the boolean row of tiles allowed next to tile in that direction
+        self.compatibilities: np.ndarray = np.zeros((4, tileCount, tileCount), dtype=np.bool_)
+        for direction in range(4):
+            for tileIndex in range(tileCount):
+                for allowed in CompiledRuleSet.maskIndexes(self.rules.getMask(direction, tileIndex)):
+                    self.compatibilities[direction, tileIndex, allowed] = True
+
+        self.weights: np.ndarray = np.array(self.rules.weights, dtype=np.float64)
+        self.weightLogWeights: np.ndarray = np.array(self.rules.weightLogWeights, dtype=np.float64)
+        self._initialEntropy: float = CompiledRuleSet.getEntropy(self.weights.sum(), self.weightLogWeights.sum())
+
+        # (direction, axis, neighbour index, has neighbour) for every direction, the index maps each row (or col)
+        # to the one next to it on that side, wrapped on periodic axes, so windows gather neighbours without bounds checks
+        self._neighbourIndexes: list[tuple[int, int, np.ndarray, np.ndarray]] = []
+        for direction, rowOffset, colOffset in WaveFunctionCollapse._NEIGHBOURS:
+            axis: int = 0 if rowOffset != 0 else 1
+            size: int = self.height if axis == 0 else self.width
+            periodic: bool = self.periodicY if axis == 0 else self.periodicX
+
+            neighbours: np.ndarray = np.arange(size) + rowOffset + colOffset
+            hasNeighbour: np.ndarray = np.ones(size, dtype=np.bool_) if periodic else (neighbours >= 0) & (neighbours < size)
+            # cells without a neighbour point at any valid index, hasNeighbour masks whatever is gathered from it
+            self._neighbourIndexes.append((direction, axis, neighbours % size, hasNeighbour))
+
+        # used to measure windows, whether their axes are slices or index arrays
+        self._rowIndexes: np.ndarray = np.arange(self.height)
+        self._colIndexes: np.ndarray = np.arange(self.width)
+        # flat index of every cell, gathered through a window to push its cells onto the entropy heap
+        self._cellIndexes: np.ndarray = np.arange(self.width * self.height).reshape(self.height, self.width)
+
+    def _allocate(self) -> None:
+        tileCount: int = len(self.rules.tiles)
+        self.ids: array = array('H', [WaveFunctionCollapse.UNCOLLAPSED_ID]) * (self.width * self.height)
+        self.collapsed: np.ndarray = np.zeros((self.height, self.width), dtype=np.bool_)
+        self.options: np.ndarray = np.ones((self.height, self.width, tileCount), dtype=np.bool_)
+        self.entropies: np.ndarray = np.zeros((self.height, self.width), dtype=np.float64)
+        # flat views for the heap, which holds flat indexes like the base engine's
+        self._flatEntropies: np.ndarray = self.entropies.reshape(-1)
+        self._flatCollapsed: np.ndarray = self.collapsed.reshape(-1)
+        # (entropy, tie breaker, index) entries, stale once the entropy no longer matches or the cell has collapsed,
+        # so picking a cell doesn't have to scan the grid
+        self._entropyHeap: list[tuple[float, float, int]] = []
+
+        # undo log of (rows, cols, options, entropies, collapsed) blocks saved before every write
+        self._trail: list[tuple[Axis, Axis, np.ndarray, np.ndarray, np.ndarray]] = []
+        self._decisions: list[tuple[int, int, int, int]] = []
+        self.changedCells: list[tuple[int, int]] = []
+
+    def _initState(self) -> None:
+        self.ids[:] = array('H', [WaveFunctionCollapse.UNCOLLAPSED_ID]) * (self.width * self.height)
+        self.collapsed.fill(False)
+        self.options.fill(True)
+        self.entropies.fill(self._initialEntropy)
+
+        cellCount: int = self.width * self.height
+        tiebreaks: np.ndarray = self.rand.random(cellCount)
+        if (self.restartPolicy == WaveFunctionCollapse.HOTSPOTS_POLICY):
+            # cells that contradicted more often sort first among the cells nothing has narrowed yet
+            tiebreaks -= np.frombuffer(self.history.counts, dtype=np.uintc)
+        self._entropyHeap[:] = zip([self._initialEntropy] * cellCount, tiebreaks.tolist(), range(cellCount))
+        heapq.heapify(self._entropyHeap)
+
+        self._trail.clear()
+        self._decisions.clear()
+        self._backtracksLeft: int = self.maxBacktracks
+        self._rerollsLeft: int = self.maxRerolls
+        self._complete: bool = False
+
+        self.contradiction: tuple[int, int] | None = None
+        self.changedCells.clear()
+
+    def getCell(self, ROW: int, COL: int) -> CellView:
+        return CellView(ROW, COL, self.getTile(ROW, COL), np.flatnonzero(self.options[ROW, COL]).tolist(),
+        float(self.entropies[ROW, COL]))
+
+    def _selectCell(self) -> tuple[int, int] | None:
+        while (len(self._entropyHeap) != 0):
+            entropy, _, index = heapq.heappop(self._entropyHeap)
+            if (entropy == self._flatEntropies[index] and not self._flatCollapsed[index]):
+                return divmod(index, self.width)
+
+        return None
+
+    def _pushEntropies(self, window: tuple, cells: np.ndarray | None = None) -> None:
+        # pushes the uncollapsed cells of the window (only those set in the cells mask, if given), the seeded
+        # tie breakers keep the choice between equal entropies random but reproducible
+        uncollapsed: np.ndarray = ~self.collapsed[window]
+        indexes: np.ndarray = self._cellIndexes[window][uncollapsed if cells is None else uncollapsed & cells]
+        for entry in zip(self._flatEntropies[indexes].tolist(), self.rand.random(len(indexes)).tolist(), indexes.tolist()):
+            heapq.heappush(self._entropyHeap, entry)
+
+    def _applyRestriction(self, ROW: int, COL: int, allowed: int) -> bool:
+        allowedTiles: np.ndarray = np.zeros(len(self.rules.tiles), dtype=np.bool_)
+        allowedTiles[CompiledRuleSet.maskIndexes(allowed)] = True
+
+        newOptions: np.ndarray = self.options[ROW, COL] & allowedTiles
+        if ((newOptions == self.options[ROW, COL]).all()):
+            return True
+
+        if (not newOptions.any()):
+            self.contradiction = (ROW, COL)
+            return False
+
+        self._record(slice(ROW, ROW + 1), slice(COL, COL + 1))
+        self.options[ROW, COL] = newOptions
+        if (not self.collapsed[ROW, COL]):
+            self.entropies[ROW, COL] = self._getEntropies(newOptions)
+            self._pushEntropies((slice(ROW, ROW + 1), slice(COL, COL + 1)))
+
+        return self._propagate(ROW, ROW + 1, COL, COL + 1)
+
+    def _applyPin(self, ROW: int, COL: int, tileIndex: int) -> bool:
+        if (not self.options[ROW, COL, tileIndex]):
+            self.contradiction = (ROW, COL)
+            return False
+
+        self._record(slice(ROW, ROW + 1), slice(COL, COL + 1))
+        self.ids[ROW * self.width + COL] = tileIndex
+        self.changedCells.append((ROW, COL))
+        self.collapsed[ROW, COL] = True
+        self.options[ROW, COL] = False
+        self.options[ROW, COL, tileIndex] = True
+        self.entropies[ROW, COL] = 0
+
+        return self._propagate(ROW, ROW + 1, COL, COL + 1)
+
+    def _clearRegion(self, top: int, bottom: int, left: int, right: int) -> bool:
+        for r in range(top, bottom):
+            self.ids[r * self.width + left:r * self.width + right] = array('H', [WaveFunctionCollapse.UNCOLLAPSED_ID]) * (right - left)
+            self.changedCells.extend((r, c) for c in range(left, right))
+
+        self.options[top:bottom, left:right] = True
+        self.collapsed[top:bottom, left:right] = False
+        self.entropies[top:bottom, left:right] = self._initialEntropy
+        self._pushEntropies((slice(top, bottom), slice(left, right)))
+
+        # the first pass of the window around the rectangle narrows it down to fit the fixed cells
+        return self._propagate(top, bottom, left, right)
+
+    def _chooseTile(self, ROW: int, COL: int) -> int:
+        # weighted choice, a binary search of the cell's cumulative weight table
+        indexes: np.ndarray = np.flatnonzero(self.options[ROW, COL])
+        cumulative: np.ndarray = np.cumsum(self.weights[indexes])
+        return int(indexes[np.searchsorted(cumulative, self.rand.random() * cumulative[-1], side="right")])
+
+    def _assign(self, ROW: int, COL: int, tileIndex: int) -> bool:
+        self.stats.collapses += 1
+        if (self.maxBacktracks != 0):
+            self._decisions.append((ROW, COL, tileIndex, len(self._trail)))
+
+        self._record(slice(ROW, ROW + 1), slice(COL, COL + 1))
+        self.ids[ROW * self.width + COL] = tileIndex
+        self.changedCells.append((ROW, COL))
+        self.collapsed[ROW, COL] = True
+        self.options[ROW, COL] = False
+        self.options[ROW, COL, tileIndex] = True
+        self.entropies[ROW, COL] = 0
+
+        return self._propagate(ROW, ROW + 1, COL, COL + 1)
+
+    def _propagate(self, top: int, bottom: int, left: int, right: int) -> bool:
+        # [top, bottom) x [left, right) bounds the cells that changed in the last pass, so only the window around
+        # them has to be narrowed again, on periodic axes the bounds can run past the edges and wrap around
+        while (True):
+            top, bottom = NumpyWaveFunctionCollapse._expand(top, bottom, self.height, self.periodicY)
+            left, right = NumpyWaveFunctionCollapse._expand(left, right, self.width, self.periodicX)
+            rows: Axis = NumpyWaveFunctionCollapse._getAxis(top, bottom, self.height)
+            cols: Axis = NumpyWaveFunctionCollapse._getAxis(left, right, self.width)
+            window: tuple = NumpyWaveFunctionCollapse._getWindow(rows, cols)
+
+            options: np.ndarray = self.options[window]
+            self.stats.propagations += 1
+            newOptions: np.ndarray = options & self._supported(rows, cols)
+            changed: np.ndarray = (newOptions != options).any(axis=2)
+            if (not changed.any()):
+                return True
+
+            empty: np.ndarray = ~newOptions.any(axis=2)
+            if (empty.any()):
+                emptyRow, emptyCol = np.argwhere(empty)[0]
+                self.contradiction = ((top + int(emptyRow)) % self.height, (left + int(emptyCol)) % self.width)
+                return False
+
+            self._record(rows, cols)
+            self.options[window] = newOptions
+            self.entropies[window] = np.where(self.collapsed[window], 0, self._getEntropies(newOptions))
+            self._pushEntropies(window, changed)
+
+            changedRows: np.ndarray = np.flatnonzero(changed.any(axis=1))
+            changedCols: np.ndarray = np.flatnonzero(changed.any(axis=0))
+            top, bottom = top + int(changedRows[0]), top + int(changedRows[-1]) + 1
+            left, right = left + int(changedCols[0]), left + int(changedCols[-1]) + 1
+
+    def _backtrack(self) -> bool:
+        while (self._backtracksLeft > 0 and len(self._decisions) != 0):
+            self._backtracksLeft -= 1
+            self.stats.backtracks += 1
+
+            ROW, COL, tileIndex, trailLength = self._decisions.pop()
+            self._undo(trailLength)
+            self.ids[ROW * self.width + COL] = WaveFunctionCollapse.UNCOLLAPSED_ID
+            self.changedCells.append((ROW, COL))
+
+            if (np.count_nonzero(self.options[ROW, COL]) == 1):
+                continue
+
+            self._record(slice(ROW, ROW + 1), slice(COL, COL + 1))
+            self.options[ROW, COL, tileIndex] = False
+            self.entropies[ROW, COL] = self._getEntropies(self.options[ROW, COL])
+            self._pushEntropies((slice(ROW, ROW + 1), slice(COL, COL + 1)))
+
+            if (self._propagate(ROW, ROW + 1, COL, COL + 1)):
+                return True
+
+        return False
+
+    def _record(self, rows: Axis, cols: Axis) -> None:
+        if (self.maxBacktracks != 0):
+            window: tuple = NumpyWaveFunctionCollapse._getWindow(rows, cols)
+            self._trail.append((rows, cols, self.options[window].copy(), self.entropies[window].copy(),
+            self.collapsed[window].copy()))
+
+    def _undo(self, trailLength: int) -> None:
+        while (len(self._trail) > trailLength):
+            rows, cols, options, entropies, collapsed = self._trail.pop()
+            window: tuple = NumpyWaveFunctionCollapse._getWindow(rows, cols)
+            self.options[window] = options
+            self.entropies[window] = entropies
+            self.collapsed[window] = collapsed
+            self._pushEntropies(window)
+
+    def _getEntropies(self, options: np.ndarray) -> np.ndarray:
+        # Shannon entropy over the last axis, the sums come from matmuls with the precomputed weight tables
+        sumWeights: np.ndarray = options @ self.weights
+        return np.log(sumWeights) - (options @ self.weightLogWeights) / sumWeights
+
+    def _supported(self, rows: Axis, cols: Axis) -> np.ndarray:
+        # boolean matmul ORs together the masks of every option the neighbour still has
+        supported: np.ndarray = np.ones((len(self._rowIndexes[rows]), len(self._colIndexes[cols]), len(self.rules.tiles)),
+        dtype=np.bool_)
+
+        for direction, axis, neighbours, hasNeighbour in self._neighbourIndexes:
+            # the neighbour on this side allows whatever its options allow on the opposite side of it
+            compatibilities: np.ndarray = self.compatibilities[CompiledRuleSet.opposite(direction)]
+            if (axis == 0):
+                neighbourOptions: np.ndarray = self.options[NumpyWaveFunctionCollapse._getWindow(neighbours[rows], cols)]
+                supported &= (neighbourOptions @ compatibilities) | ~hasNeighbour[rows][:, None, None]
+            else:
+                neighbourOptions = self.options[NumpyWaveFunctionCollapse._getWindow(rows, neighbours[cols])]
+                supported &= (neighbourOptions @ compatibilities) | ~hasNeighbour[cols][None, :, None]
+
+        return supported
+
+    @staticmethod
+    def _expand(start: int, end: int, size: int, periodic: bool) -> tuple[int, int]:
+        start, end = start - 1, end + 1
+        if (not periodic):
+            return (max(start, 0), min(end, size))
+
+        if (end - start >= size):
+            return (0, size)
+
+        return (start, end)
+
+    @staticmethod
+    def _getAxis(start: int, end: int, size: int) -> Axis:
+        if (0 <= start and end <= size):
+            return slice(start, end)
+
+        return np.arange(start, end) % size
+
+    @staticmethod
+    def _getWindow(rows: Axis, cols: Axis) -> tuple:
+        # two index arrays would be paired up element by element, np.ix_ turns them into a block instead
+        if (isinstance(rows, np.ndarray) and isinstance(cols, np.ndarray)):
+            return np.ix_(rows, cols)
+
+        return (rows, cols)
\ No newline at end of file